@@ -0,0 +1,142 @@
+"""Mock of the GitHub API endpoints used by the GitHub service.
+
+Run from the repository's src directory:
+
+    python -m benchmarks.fake_github [--port 9000] [--repos 250] [--latency-ms 20] [--rate-limit 5000]
+
+Then point the service at it with ``GITHUB_API_URL=http://localhost:9000``
+and ``GITHUB_OAUTH_URL=http://localhost:9000/login/oauth``. Responses carry
+ETag, Link and rate-limit headers like the real API, with a simulated
+upstream latency. Tests queue error responses with ``fail_next``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+def _repo(index: int) -> dict:
+    return {
+        "id": index,
+        "name": f"repo-{index}",
+        "full_name": f"octocat/repo-{index}",
+        "private": index % 5 == 0,
+        "html_url": f"https://github.com/octocat/repo-{index}",
+        "description": f"Benchmark repository {index}",
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-06-01T00:00:00Z",
+    }
+
+
+USER = {
+    "id": 1,
+    "login": "octocat",
+    "name": "The Octocat",
+    "email": None,
+    "avatar_url": "https://github.com/images/error/octocat_happy.gif",
+    "html_url": "https://github.com/octocat",
+    "created_at": "2011-01-25T18:44:36Z",
+}
+
+
+class FakeGitHub:
+    def __init__(self, repos: int = 250, latency_ms: float = 20.0, rate_limit: int = 5000):
+        self.repos = [_repo(i) for i in range(1, repos + 1)]
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.not_modified = 0
+        # Remaining budget per Authorization header
+        self.budgets = {}
+        # Client (host, port) pairs seen, i.e. TCP connections opened
+        self.connections = set()
+        # (status, headers) served instead of the next responses
+        self.failures = []
+
+    def fail_next(self, status: int, count: int = 1, headers: Optional[Dict[str, str]] = None):
+        """Answer the next ``count`` requests with ``status`` and ``headers``"""
+        self.failures.extend([(status, headers or {})] * count)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/user", self.user)
+        app.router.add_get("/user/repos", self.list_repos)
+        app.router.add_post("/user/repos", self.create_repo)
+        app.router.add_post("/login/oauth/access_token", self.access_token)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def _respond(self, request: web.Request, body) -> web.Response:
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(self.latency)
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            return web.json_response({"message": "Injected failure"}, status=status, headers=headers)
+        token = request.headers.get("Authorization", "")
+        remaining = self.budgets.get(token, self.rate_limit) - 1
+        self.budgets[token] = max(remaining, 0)
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(remaining, 0)),
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+        }
+        raw = json.dumps(body).encode()
+        etag = '"' + hashlib.md5(raw).hexdigest() + '"'
+        headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=raw, headers=headers, content_type="application/json")
+
+    async def user(self, request: web.Request) -> web.Response:
+        return await self._respond(request, USER)
+
+    async def list_repos(self, request: web.Request) -> web.Response:
+        per_page = min(int(request.query.get("per_page", "30")), 100)
+        page = int(request.query.get("page", "1"))
+        last = max((len(self.repos) + per_page - 1) // per_page, 1)
+        start = (page - 1) * per_page
+        response = await self._respond(request, self.repos[start:start + per_page])
+        if page < last:
+            base = request.url.with_query({"per_page": per_page})
+            response.headers["Link"] = (
+                f'<{base.update_query(page=page + 1)}>; rel="next", '
+                f'<{base.update_query(page=last)}>; rel="last"'
+            )
+        return response
+
+    async def create_repo(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        repo = _repo(len(self.repos) + 1)
+        repo.update(name=data["name"], full_name=f"octocat/{data['name']}", private=data.get("private", False))
+        self.repos.append(repo)
+        response = await self._respond(request, repo)
+        if response.status == 200:
+            response.set_status(201)
+        return response
+
+    async def access_token(self, request: web.Request) -> web.Response:
+        return await self._respond(request, {"access_token": "gho_benchmark", "token_type": "bearer", "scope": "repo,user"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests, "not_modified": self.not_modified})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--repos", type=int, default=250)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--rate-limit", type=int, default=5000, help="Requests per token before pacing applies")
+    args = parser.parse_args()
+    web.run_app(FakeGitHub(args.repos, args.latency_ms, args.rate_limit).app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
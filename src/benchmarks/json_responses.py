@@ -0,0 +1,195 @@
+"""Per-request CPU cost of encoding list pages as JSON.
+
+Run from the repository's src directory:
+
+    python -m benchmarks.json_responses [--iterations N] [--page-sizes 100,1000]
+        [--database-url DSN] [--json results.json]
+
+For each page size, fetches a page of ``users`` and ``products`` and
+encodes it three ways:
+
+* ``fastapi``: rows to dicts, ``jsonable_encoder``, then ``json.dumps`` as
+  ``JSONResponse`` does (the path list endpoints used to take)
+* ``orjson``: rows to dicts encoded by orjson, if installed
+* ``postgres``: ``fetch_json_page``, with Postgres building each row's
+  JSON and the service only joining strings
+
+CPU is the benchmark process's own CPU time per request, i.e. what a
+service worker spends; wall time also includes the database. Compression
+cost for the largest page is reported separately. Postgres comes from
+``--database-url`` / ``DATABASE_URL`` or a throwaway ``pgserver`` cluster;
+rows are added if the tables are smaller than the largest page.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.load import INIT_SQL, start_postgres
+from services.common.pagination import fetch_json_page
+from services.common.responses import BROTLI_QUALITY, GZIP_LEVEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Query, its ORDER BY clause and the keyset cursor columns, as the services page them
+QUERIES = {
+    "users": (
+        "SELECT id, name, email, created_at FROM users ORDER BY created_at DESC, id DESC",
+        "created_at DESC, id DESC",
+        ("created_at", "id"),
+    ),
+    "products": ("SELECT * FROM products ORDER BY id DESC", "id DESC", ("id",)),
+}
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+async def encode_fastapi(conn: asyncpg.Connection, query: str, limit: int, *_) -> bytes:
+    rows = await conn.fetch(f"{query} LIMIT $1", limit)
+    content = jsonable_encoder([dict(row) for row in rows])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+async def encode_orjson(conn: asyncpg.Connection, query: str, limit: int, *_) -> bytes:
+    rows = await conn.fetch(f"{query} LIMIT $1", limit)
+    return orjson.dumps([dict(row) for row in rows], default=_orjson_default)
+
+
+async def encode_postgres(conn: asyncpg.Connection, query: str, limit: int, order_by: str, cursor_columns) -> bytes:
+    body, _ = await fetch_json_page(conn, query, limit=limit, cursor_columns=cursor_columns, order_by=order_by)
+    return body
+
+
+ENCODERS: Dict[str, Callable] = {"fastapi": encode_fastapi, "postgres": encode_postgres}
+if orjson is not None:
+    ENCODERS["orjson"] = encode_orjson
+
+
+async def measure(func, iterations: int):
+    """CPU and wall milliseconds per call, after one warm-up call"""
+    result = await func()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    cpu = (time.process_time() - cpu_start) / iterations * 1000
+    wall = (time.perf_counter() - wall_start) / iterations * 1000
+    return result, cpu, wall
+
+
+async def seed(conn: asyncpg.Connection, rows: int):
+    with open(INIT_SQL) as f:
+        await conn.execute(f.read())
+    run_id = int(time.time())
+    missing = rows - await conn.fetchval("SELECT count(*) FROM users")
+    if missing > 0:
+        await conn.copy_records_to_table(
+            "users",
+            records=[(f"Json {run_id} {i}", f"json_{run_id}_{i}@example.com", f"json_{run_id}_{i}", "x") for i in range(missing)],
+            columns=["name", "email", "username", "password"],
+        )
+    missing = rows - await conn.fetchval("SELECT count(*) FROM products")
+    if missing > 0:
+        await conn.copy_records_to_table(
+            "products",
+            records=[(f"json {run_id} {i}", Decimal(i % 500) + Decimal("0.99")) for i in range(missing)],
+            columns=["name", "price"],
+        )
+
+
+async def run(dsn: str, page_sizes: List[int], iterations: int) -> Dict[str, Any]:
+    conn = await asyncpg.connect(dsn, server_settings={"timezone": "UTC"})
+    try:
+        await seed(conn, max(page_sizes))
+        rows = []
+        for table, (query, order_by, cursor_columns) in QUERIES.items():
+            for limit in page_sizes:
+                baseline = None
+                for name, encoder in ENCODERS.items():
+                    body, cpu, wall = await measure(
+                        lambda: encoder(conn, query, limit, order_by, cursor_columns), iterations
+                    )
+                    assert len(json.loads(body)) == limit
+                    baseline = baseline or cpu
+                    rows.append({
+                        "table": table,
+                        "rows": limit,
+                        "encoder": name,
+                        "bytes": len(body),
+                        "cpu_ms": cpu,
+                        "wall_ms": wall,
+                        "cpu_saved_pct": (1 - cpu / baseline) * 100,
+                    })
+
+        query, order_by, cursor_columns = QUERIES["products"]
+        body, _ = await fetch_json_page(
+            conn, query, limit=max(page_sizes), cursor_columns=cursor_columns, order_by=order_by
+        )
+        compression = []
+        codecs = {"gzip": lambda: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            codecs["br"] = lambda: brotli.compress(body, quality=BROTLI_QUALITY)
+        for name, compress in codecs.items():
+            start = time.process_time()
+            for _ in range(iterations):
+                compressed = compress()
+            compression.append({
+                "encoding": name,
+                "bytes": len(body),
+                "compressed_bytes": len(compressed),
+                "cpu_ms": (time.process_time() - start) / iterations * 1000,
+            })
+        return {"encoding": rows, "compression": compression}
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--page-sizes", default="100,1000")
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        dsn = start_postgres(args, stack)
+        page_sizes = [int(size) for size in args.page_sizes.split(",")]
+        results = asyncio.run(run(dsn, page_sizes, args.iterations))
+
+    print(f"{'table':<10} {'rows':>6} {'encoder':<10} {'bytes':>9} {'cpu ms':>8} {'wall ms':>8} {'cpu saved':>10}")
+    for row in results["encoding"]:
+        print(
+            f"{row['table']:<10} {row['rows']:>6} {row['encoder']:<10} {row['bytes']:>9} "
+            f"{row['cpu_ms']:>8.3f} {row['wall_ms']:>8.3f} {row['cpu_saved_pct']:>9.1f}%"
+        )
+    print()
+    print(f"{'encoding':<10} {'bytes':>9} {'compressed':>11} {'cpu ms':>8}")
+    for row in results["compression"]:
+        print(f"{row['encoding']:<10} {row['bytes']:>9} {row['compressed_bytes']:>11} {row['cpu_ms']:>8.3f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
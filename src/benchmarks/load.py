@@ -0,0 +1,496 @@
+"""End-to-end load test for the user, product and GitHub services.
+
+Run from the repository's src directory:
+
+    python -m benchmarks.load [--duration 10] [--concurrency 32]
+        [--scenarios users.list,products.get,...] [--composite]
+        [--json results.json] [--compare previous.json]
+
+Stand-ins are started for anything not already available (install them
+with ``pip install -e ".[benchmark]"``):
+
+* Postgres: ``--database-url`` / ``DATABASE_URL``, otherwise a throwaway
+  cluster from the ``pgserver`` package. The benchmark writes rows, so
+  point it at a disposable database.
+* Redis: ``REDIS_HOST``/``REDIS_PORT`` if reachable, otherwise an
+  in-memory ``fakeredis`` TCP server.
+* GitHub: always ``benchmarks.fake_github``.
+
+Each service runs as its own uvicorn process (or one composite process
+with ``--composite``). Every scenario is driven for ``--duration`` seconds
+by ``--concurrency`` clients, and throughput plus p50/p95/p99 latency are
+reported per scenario.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import asyncpg
+
+from services.message_queue.async_queue import AsyncMessageQueue
+from services.message_queue.models import Message
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INIT_SQL = os.path.join(SRC_DIR, "sql", "init.sql")
+
+APPS = {
+    "users": "services.user_service.main:app",
+    "products": "services.product_service.main:app",
+    "github": "services.github_service.main:app",
+}
+# Mount prefixes of services.composite.main
+COMPOSITE_PREFIXES = {"users": "/user", "products": "/product", "github": "/github"}
+
+BENCH_TOKEN = "gho_benchmark"
+
+
+class Context:
+    """Data shared by the request builders of one run"""
+
+    def __init__(self, bulk_size: int):
+        self.run_id = f"{int(time.time())}{os.getpid()}"
+        self.bulk_size = bulk_size
+        self.counter = itertools.count()
+        self.user_ids: List[int] = []
+        self.product_ids: List[int] = []
+
+    def unique(self) -> str:
+        return f"{self.run_id}_{next(self.counter)}"
+
+
+Request = Tuple[str, str, str, Dict[str, Any]]
+
+
+def _pick(ids: List[int], n: int) -> int:
+    return ids[n % len(ids)] if ids else 1
+
+
+def _ids(ids: List[int], n: int, count: int = 20) -> str:
+    return ",".join(str(_pick(ids, n * count + i)) for i in range(count))
+
+
+def _new_user(ctx: Context) -> Dict[str, Any]:
+    name = ctx.unique()
+    return {"name": f"Bench {name}", "email": f"bench_{name}@example.com", "username": f"bench_{name}", "password": "benchmark"}
+
+
+def _products_ndjson(ctx: Context) -> bytes:
+    name = ctx.unique()
+    return "".join(
+        json.dumps({"name": f"bench {name} {i}", "price": f"{i % 500}.99"}) + "\n" for i in range(ctx.bulk_size)
+    ).encode()
+
+
+# name -> (builder, max concurrency or None)
+SCENARIOS: Dict[str, Tuple[Callable[[Context, int], Request], Optional[int]]] = {
+    "users.list": (lambda ctx, n: ("users", "GET", "/users", {"params": {"limit": 50}}), None),
+    "users.get": (lambda ctx, n: ("users", "GET", f"/users/{_pick(ctx.user_ids, n)}", {}), None),
+    "users.batch": (lambda ctx, n: ("users", "GET", "/users", {"params": {"ids": _ids(ctx.user_ids, n)}}), None),
+    "users.create": (lambda ctx, n: ("users", "POST", "/users", {"json": _new_user(ctx)}), None),
+    "users.bulk": (
+        lambda ctx, n: ("users", "POST", "/users/bulk", {"json": [_new_user(ctx) for _ in range(ctx.bulk_size)]}),
+        4,
+    ),
+    "products.list": (lambda ctx, n: ("products", "GET", "/products", {"params": {"limit": 50}}), None),
+    "products.get": (lambda ctx, n: ("products", "GET", f"/products/{_pick(ctx.product_ids, n)}", {}), None),
+    "products.batch": (
+        lambda ctx, n: ("products", "GET", "/products", {"params": {"ids": _ids(ctx.product_ids, n)}}),
+        None,
+    ),
+    "products.create": (
+        lambda ctx, n: ("products", "POST", "/products", {"json": {"name": f"bench {ctx.unique()}", "price": "9.99"}}),
+        None,
+    ),
+    "products.bulk": (
+        lambda ctx, n: (
+            "products", "POST", "/products/bulk",
+            {"data": _products_ndjson(ctx), "headers": {"Content-Type": "application/x-ndjson"}},
+        ),
+        4,
+    ),
+    "github.repositories": (
+        lambda ctx, n: ("github", "GET", "/repositories", {"params": {"access_token": BENCH_TOKEN}}),
+        None,
+    ),
+    "github.repositories_stream": (
+        lambda ctx, n: ("github", "GET", "/repositories", {"params": {"access_token": BENCH_TOKEN, "stream": "true"}}),
+        None,
+    ),
+}
+MQ_SCENARIO = "mq.fanout"
+ALL_SCENARIOS = list(SCENARIOS) + [MQ_SCENARIO]
+
+
+def summarize(name: str, latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)] * 1000
+
+    return {
+        "scenario": name,
+        "requests": len(ordered),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+async def run_http(
+    session: aiohttp.ClientSession,
+    urls: Dict[str, str],
+    name: str,
+    ctx: Context,
+    duration: float,
+    concurrency: int,
+) -> Dict[str, Any]:
+    build, max_concurrency = SCENARIOS[name]
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            service, method, path, kwargs = build(ctx, next(ctx.counter))
+            sent = time.perf_counter()
+            try:
+                async with session.request(method, urls[service] + path, **kwargs) as response:
+                    await response.read()
+                    failed = response.status >= 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                failed = True
+            latencies.append(time.perf_counter() - sent)
+            errors += failed
+
+    clients = min(concurrency, max_concurrency or concurrency)
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return summarize(name, latencies, errors, time.perf_counter() - started)
+
+
+async def run_fanout(host: str, port: int, duration: float, concurrency: int, subscribers: int) -> List[Dict[str, Any]]:
+    """Publish to one channel with ``subscribers`` connections listening.
+
+    Reports publish latency and publish-to-callback delivery latency.
+    """
+    channel = "bench.fanout"
+    deliveries: List[float] = []
+
+    def on_message(message: Message):
+        deliveries.append(time.perf_counter() - message.payload["sent"])
+
+    publisher = AsyncMessageQueue(host=host, port=port)
+    listeners = [AsyncMessageQueue(host=host, port=port) for _ in range(subscribers)]
+    for queue in [publisher] + listeners:
+        await queue.connect()
+        if not await queue.wait_connected(10):
+            raise RuntimeError(f"Could not connect to Redis at {host}:{port}")
+    for listener in listeners:
+        await listener.subscribe(channel, on_message)
+    # Let the subscriptions register before publishing
+    await asyncio.sleep(0.5)
+
+    publish_latencies: List[float] = []
+    publish_errors = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def producer():
+        nonlocal publish_errors
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            message = Message(event_type=channel, payload={"sent": sent}, service="benchmark")
+            ok = await publisher.publish(message)
+            publish_latencies.append(time.perf_counter() - sent)
+            publish_errors += not ok
+
+    await asyncio.gather(*(producer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    expected = (len(publish_latencies) - publish_errors) * subscribers
+    drain_deadline = time.perf_counter() + 5
+    while len(deliveries) < expected and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.05)
+
+    for queue in [publisher] + listeners:
+        await queue.close()
+    return [
+        summarize("mq.publish", publish_latencies, publish_errors, elapsed),
+        summarize(MQ_SCENARIO, deliveries, max(expected - len(deliveries), 0), elapsed),
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def reachable(host: str, port: int) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def start_postgres(args, stack: ExitStack) -> str:
+    dsn = args.database_url or os.environ.get("DATABASE_URL")
+    if dsn:
+        return dsn
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit("No DATABASE_URL given and pgserver is not installed (pip install -e '.[benchmark]')")
+    server = pgserver.get_server(tempfile.mkdtemp(prefix="bench-pg-"), cleanup_mode="delete")
+    stack.callback(server.cleanup)
+    print("Started throwaway Postgres (pgserver)")
+    return server.get_uri()
+
+
+def start_redis(stack: ExitStack) -> Tuple[str, int]:
+    host = os.environ.get("REDIS_HOST", "127.0.0.1")
+    port = int(os.environ.get("REDIS_PORT", "6379"))
+    if reachable(host, port):
+        return host, port
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        sys.exit(
+            f"Redis is not reachable at {host}:{port} and fakeredis is not installed (pip install -e '.[benchmark]')"
+        )
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stack.callback(server.server_close)
+    stack.callback(server.shutdown)
+    print(f"Started in-memory fakeredis on port {port}")
+    return "127.0.0.1", port
+
+
+def spawn(stack: ExitStack, command: List[str], env: Dict[str, str], log_dir: Optional[str], name: str):
+    log = subprocess.DEVNULL
+    if log_dir:
+        log = stack.enter_context(open(os.path.join(log_dir, f"{name}.log"), "w"))
+    process = subprocess.Popen(command, cwd=SRC_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop():
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    stack.callback(stop)
+    return process
+
+
+def start_services(args, stack: ExitStack, dsn: str, redis: Tuple[str, int]) -> Dict[str, str]:
+    github_port = free_port()
+    spawn(
+        stack,
+        [sys.executable, "-m", "benchmarks.fake_github", "--port", str(github_port),
+         "--repos", str(args.github_repos), "--latency-ms", str(args.github_latency_ms),
+         # Large enough that the service's rate-limit pacing stays out of the numbers
+         "--rate-limit", str(10 ** 9)],
+        dict(os.environ), args.log_dir, "fake_github",
+    )
+    env = dict(
+        os.environ,
+        DATABASE_URL=dsn,
+        REDIS_HOST=redis[0],
+        REDIS_PORT=str(redis[1]),
+        GITHUB_CLIENT_ID="benchmark",
+        GITHUB_CLIENT_SECRET="benchmark",
+        GITHUB_API_URL=f"http://127.0.0.1:{github_port}",
+        GITHUB_OAUTH_URL=f"http://127.0.0.1:{github_port}/login/oauth",
+    )
+    uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning", "--no-access-log"]
+
+    if args.composite:
+        port = free_port()
+        spawn(stack, uvicorn + ["--port", str(port), "services.composite.main:app"], env, args.log_dir, "composite")
+        return {name: f"http://127.0.0.1:{port}{prefix}" for name, prefix in COMPOSITE_PREFIXES.items()}
+
+    urls = {}
+    for name, app in APPS.items():
+        port = free_port()
+        spawn(stack, uvicorn + ["--port", str(port), app], env, args.log_dir, name)
+        urls[name] = f"http://127.0.0.1:{port}"
+    return urls
+
+
+async def wait_healthy(session: aiohttp.ClientSession, urls: Dict[str, str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    for name, url in urls.items():
+        while True:
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        break
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                sys.exit(f"{name} did not become healthy at {url}")
+            await asyncio.sleep(0.2)
+
+
+async def prepare_database(dsn: str, ctx: Context, seed: int):
+    """Apply the schema and seed rows for the read scenarios"""
+    conn = await asyncpg.connect(dsn)
+    try:
+        with open(INIT_SQL) as f:
+            await conn.execute(f.read())
+        await conn.copy_records_to_table(
+            "users",
+            records=[
+                (f"Seed {ctx.run_id} {i}", f"seed_{ctx.run_id}_{i}@example.com", f"seed_{ctx.run_id}_{i}", "seed")
+                for i in range(seed)
+            ],
+            columns=["name", "email", "username", "password"],
+        )
+        await conn.copy_records_to_table(
+            "products",
+            records=[(f"seed {ctx.run_id} {i}", i % 500 + 0.99) for i in range(seed)],
+            columns=["name", "price"],
+        )
+        ctx.user_ids = [r["id"] for r in await conn.fetch("SELECT id FROM users ORDER BY id DESC LIMIT $1", seed)]
+        ctx.product_ids = [r["id"] for r in await conn.fetch("SELECT id FROM products ORDER BY id DESC LIMIT $1", seed)]
+    finally:
+        await conn.close()
+
+
+async def run(args) -> Dict[str, Any]:
+    scenarios = args.scenarios.split(",") if args.scenarios else ALL_SCENARIOS
+    unknown = set(scenarios) - set(ALL_SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    ctx = Context(args.bulk_size)
+    results = []
+    with ExitStack() as stack:
+        dsn = start_postgres(args, stack)
+        redis = start_redis(stack)
+        await prepare_database(dsn, ctx, args.seed)
+        urls = start_services(args, stack, dsn, redis)
+
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+            await wait_healthy(session, urls)
+            for name in scenarios:
+                if name == MQ_SCENARIO:
+                    rows = await run_fanout(redis[0], redis[1], args.duration, args.concurrency, args.subscribers)
+                else:
+                    # Warm connections and caches before measuring
+                    await run_http(session, urls, name, ctx, min(args.duration / 5, 1.0), args.concurrency)
+                    rows = [await run_http(session, urls, name, ctx, args.duration, args.concurrency)]
+                for row in rows:
+                    print_row(row)
+                results.extend(rows)
+
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "config": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "bulk_size": args.bulk_size,
+            "subscribers": args.subscribers,
+            "composite": args.composite,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+HEADER = f"{'scenario':<28} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+
+
+def print_row(row: Dict[str, Any]):
+    if not getattr(print_row, "header_printed", False):
+        print(HEADER)
+        print_row.header_printed = True
+    print(
+        f"{row['scenario']:<28} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>9.1f} "
+        f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+    )
+
+
+def compare(current: Dict[str, Any], previous_path: str):
+    with open(previous_path) as f:
+        previous = {row["scenario"]: row for row in json.load(f)["results"]}
+    print(f"\nCompared with {previous_path}:")
+    print(f"{'scenario':<28} {'rps change':>11} {'p99 change':>11}")
+    for row in current["results"]:
+        before = previous.get(row["scenario"])
+        if before is None:
+            continue
+
+        def change(key: str) -> str:
+            if not before[key]:
+                return "-"
+            return f"{(row[key] - before[key]) / before[key] * 100:+.1f}%"
+
+        print(f"{row['scenario']:<28} {change('throughput_rps'):>11} {change('p99_ms'):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", help=f"Comma separated subset of: {', '.join(ALL_SCENARIOS)}")
+    parser.add_argument("--bulk-size", type=int, default=500, help="Rows per bulk request")
+    parser.add_argument("--seed", type=int, default=10000, help="Users and products inserted before the run")
+    parser.add_argument("--subscribers", type=int, default=8, help="Subscriber connections for mq.fanout")
+    parser.add_argument("--github-repos", type=int, default=250)
+    parser.add_argument("--github-latency-ms", type=float, default=20.0)
+    parser.add_argument("--database-url", help="Postgres to use instead of DATABASE_URL or a throwaway cluster")
+    parser.add_argument("--composite", action="store_true", help="Run all services in one composite process")
+    parser.add_argument("--log-dir", help="Write service output to this directory")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Keep the in-process queue clients' connection chatter out of the report
+    logging.getLogger("services").setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Micro-benchmark for MessageQueue wire codecs.
+
+Run from the repository's src directory:
+
+    python -m benchmarks.message_codecs [--iterations N] [--json results.json]
+
+Compares the original ``model_dump`` + ``json.dumps`` / ``json.loads`` +
+``Message(**data)`` path with every installed codec, validated and trusted.
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+
+from services.message_queue.codecs import available_codecs, decode_message, encode_message
+from services.message_queue.models import Message
+
+PAYLOADS = {
+    "small": {"user_id": 123, "username": "john_doe"},
+    "medium": {
+        "product_id": 42,
+        "name": "Mechanical keyboard",
+        "price": "129.99",
+        "tags": ["hardware", "input", "usb"],
+        "updated_at": datetime(2024, 5, 1, 12, 30),
+        "attributes": {f"attr_{i}": i * 1.5 for i in range(20)},
+    },
+    "large": {
+        "product_ids": list(range(1000)),
+        "items": [{"id": i, "name": f"item {i}", "qty": i % 7} for i in range(100)],
+    },
+}
+
+
+def legacy_encode(message: Message) -> str:
+    return json.dumps(message.model_dump(), default=str)
+
+
+def legacy_decode(raw: str) -> Message:
+    return Message(**json.loads(raw))
+
+
+def bench(func, iterations: int) -> float:
+    """Best-of-three microseconds per call"""
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def run(iterations: int):
+    results = []
+    for payload_name, payload in PAYLOADS.items():
+        message = Message(event_type="bench.event", payload=payload, service="benchmark")
+
+        raw = legacy_encode(message)
+        results.append({
+            "payload": payload_name,
+            "codec": "legacy-json",
+            "size_bytes": len(raw.encode()),
+            "encode_us": bench(lambda: legacy_encode(message), iterations),
+            "decode_us": bench(lambda: legacy_decode(raw), iterations),
+            "decode_trusted_us": None,
+        })
+
+        for codec_name, codec in available_codecs().items():
+            wire = encode_message(message, codec)
+            results.append({
+                "payload": payload_name,
+                "codec": codec_name,
+                "size_bytes": len(wire if isinstance(wire, bytes) else wire.encode()),
+                "encode_us": bench(lambda: encode_message(message, codec), iterations),
+                "decode_us": bench(lambda: decode_message(wire), iterations),
+                "decode_trusted_us": bench(lambda: decode_message(wire, trusted=True), iterations),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+
+    print(f"{'payload':<8} {'codec':<12} {'bytes':>7} {'encode us':>10} {'decode us':>10} {'trusted us':>11}")
+    for row in results:
+        trusted = f"{row['decode_trusted_us']:.2f}" if row["decode_trusted_us"] is not None else "-"
+        print(
+            f"{row['payload']:<8} {row['codec']:<12} {row['size_bytes']:>7} "
+            f"{row['encode_us']:>10.2f} {row['decode_us']:>10.2f} {trusted:>11}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"iterations": args.iterations, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+import asyncpg
+
+from .metrics import Histogram
+
+# Upper bound on ids accepted by one ``?ids=`` lookup
+MAX_BATCH_IDS = 1000
+
+# SERIAL primary keys are 32-bit
+MAX_ID = 2 ** 31 - 1
+
+# Errors one bad key can cause, worth retrying the batch key by key. The
+# client-side asyncpg DataError for unencodable arguments is a ValueError.
+DATA_ERRORS = (asyncpg.DataError, ValueError, TypeError)
+
+BATCH_SIZE = Histogram(
+    "batch_loader_keys", "Keys resolved per coalesced query", ["loader"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+def id_in_range(id_: int) -> bool:
+    """Whether ``id_`` fits the ``int`` columns ids are compared against"""
+    return -MAX_ID - 1 <= id_ <= MAX_ID
+
+
+def parse_ids(values: Optional[Iterable[str]], max_ids: int = MAX_BATCH_IDS) -> List[int]:
+    """Parse ``?ids=1,2,3`` (or repeated ``?ids=``) into unique ints, in order.
+
+    Raises ValueError for malformed or out-of-range ids, or more than
+    ``max_ids`` of them.
+    """
+    ids: Dict[int, None] = {}
+    for value in values or ():
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                id_ = int(part)
+            except ValueError:
+                raise ValueError(f"Invalid id: {part}")
+            if not id_in_range(id_):
+                raise ValueError(f"Id out of range: {part}")
+            ids[id_] = None
+    if len(ids) > max_ids:
+        raise ValueError(f"At most {max_ids} ids can be requested at once")
+    return list(ids)
+
+
+class BatchLoader:
+    """Coalesces concurrent single-key loads into one batched query.
+
+    Keys requested within ``window`` seconds of the first pending one are
+    resolved together by ``load_many``, which receives the distinct keys and
+    returns a dict of the ones it found; missing keys resolve to None. A
+    batch is dispatched early once it reaches ``max_batch`` keys.
+    Concurrent requests for the same key share one result. If a batch of
+    several keys fails with one of ``DATA_ERRORS``, each key is retried on
+    its own so the error only reaches the callers whose key caused it; any
+    other error (a lost connection, an exhausted pool) fails the whole
+    batch rather than multiplying the queries against a struggling database.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        window: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.name = name
+        self.load_many = load_many
+        self.window = window if window is not None else float(os.environ.get("BATCH_WINDOW_MS", "1")) / 1000
+        self.max_batch = max_batch or int(os.environ.get("BATCH_MAX_KEYS", "500"))
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.loads = 0
+        self.batches = 0
+        self.keys = 0
+
+    async def load(self, key: Hashable) -> Any:
+        self.loads += 1
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._dispatch)
+        # Shielded so one cancelled caller does not cancel the shared result
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]):
+        self.batches += 1
+        self.keys += len(batch)
+        BATCH_SIZE.observe(len(batch), self.name)
+        try:
+            found = await self.load_many(list(batch))
+        except Exception as e:
+            if len(batch) == 1 or not isinstance(e, DATA_ERRORS):
+                self._fail(batch.values(), e)
+            else:
+                await asyncio.gather(*(self._run_one(key, future) for key, future in batch.items()))
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+    async def _run_one(self, key: Hashable, future: asyncio.Future):
+        try:
+            found = await self.load_many([key])
+        except Exception as e:
+            self._fail([future], e)
+            return
+        if not future.done():
+            future.set_result(found.get(key))
+
+    @staticmethod
+    def _fail(futures: Iterable[asyncio.Future], error: Exception):
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+                # Mark it retrieved; callers that were cancelled never read it
+                future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loads": self.loads,
+            "batches": self.batches,
+            "keys": self.keys,
+            "avg_batch_size": round(self.keys / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import asyncpg
+
+from .metrics import CallbackGauge, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Distinct statements labelled individually; anything beyond shares "other"
+MAX_STATEMENT_LABELS = 500
+
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Query latency by statement", ["statement"])
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Queries that raised, by statement", ["statement"])
+DB_ACQUIRE_SECONDS = Histogram("db_pool_acquire_duration_seconds", "Time spent waiting for a pooled connection")
+DB_ACQUIRE_TIMEOUTS = Counter("db_pool_acquire_timeouts_total", "Connection checkouts that timed out")
+
+
+class Database:
+    """Bounded asyncpg connection pool shared by the FastAPI services.
+
+    Connection settings come from ``DATABASE_URL`` when set; otherwise asyncpg
+    falls back to the standard ``PGHOST``/``PGPORT``/``PGUSER``/``PGPASSWORD``/
+    ``PGDATABASE`` variables. The pool is reference counted so several apps
+    running in one process can share it.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        acquire_timeout: Optional[float] = None,
+    ):
+        self.dsn = dsn or os.environ.get("DATABASE_URL")
+        self.min_size = min_size or int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+        self.max_size = max_size or int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+        self.acquire_timeout = acquire_timeout or float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+        self.pool: Optional[asyncpg.Pool] = None
+        self._statements: Dict[str, str] = {}
+        self._users = 0
+        self._lock = asyncio.Lock()
+
+        # Checkout statistics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def connect(self):
+        """Open the pool, or join it if another app already opened it"""
+        async with self._lock:
+            self._users += 1
+            if self.pool is not None:
+                return
+            self.pool = await asyncpg.create_pool(
+                dsn=self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                init=self._init_connection,
+                # JSON built by Postgres (row_to_json) renders timestamps in
+                # the session time zone; match the UTC values asyncpg decodes
+                server_settings={"timezone": "UTC"},
+            )
+            logger.info("Database pool opened (min=%s, max=%s)", self.min_size, self.max_size)
+
+    async def disconnect(self):
+        """Release this app's hold on the pool and close it when unused"""
+        async with self._lock:
+            self._users = max(self._users - 1, 0)
+            if self._users or self.pool is None:
+                return
+            await self.pool.close()
+            self.pool = None
+            logger.info("Database pool closed")
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        conn.add_query_logger(self._record_query)
+
+    def _record_query(self, record):
+        """asyncpg query logger feeding the per-statement metrics"""
+        statement = self._statements.get(record.query)
+        if statement is None:
+            statement = " ".join(record.query.split())
+            if len(self._statements) >= MAX_STATEMENT_LABELS:
+                statement = "other"
+            else:
+                self._statements[record.query] = statement
+        DB_QUERY_SECONDS.observe(record.elapsed, statement)
+        if record.exception is not None:
+            DB_QUERY_ERRORS.inc(statement)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Check a connection out of the pool for the duration of the block"""
+        if self.pool is None:
+            raise RuntimeError("Database pool is not open")
+
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            DB_ACQUIRE_TIMEOUTS.inc()
+            raise
+        wait = time.perf_counter() - start
+        DB_ACQUIRE_SECONDS.observe(wait)
+
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_use += 1
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            await self.pool.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and checkout statistics"""
+        size = self.pool.get_size() if self.pool is not None else 0
+        idle = self.pool.get_idle_size() if self.pool is not None else 0
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": self.in_use,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+# Process-wide pool used by every service
+db = Database()
+
+DB_POOL_CONNECTIONS = CallbackGauge(
+    "db_pool_connections",
+    "Pool connections by state",
+    lambda: [((state,), db.stats()[state]) for state in ("size", "idle", "in_use", "max_size")],
+    labels=["state"],
+)
@@ -0,0 +1,9 @@
+import os
+
+from ..message_queue.async_queue import AsyncMessageQueue
+
+# Process-wide event bus connection shared by every service
+events = AsyncMessageQueue(
+    host=os.environ.get("REDIS_HOST", "0.0.0.0"),
+    port=int(os.environ.get("REDIS_PORT", "6379")),
+)
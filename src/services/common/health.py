@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from .metrics import CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Any]]
+
+
+class CheckResult:
+    __slots__ = ("ok", "latency", "error", "checked_at")
+
+    def __init__(self, ok: bool, latency: float, error: Optional[str], checked_at: float):
+        self.ok = ok
+        self.latency = latency
+        self.error = error
+        self.checked_at = checked_at
+
+
+class HealthMonitor:
+    """Probes a service's dependencies in the background and caches the results.
+
+    ``/health`` and ``/health/ready`` answer from the cache, so probes never
+    open connections or wait on a dependency. A failing ``critical`` check
+    makes the service not ready; other failures only mark it degraded.
+    ``/health/live`` reports whether the service itself is working, which
+    includes the probe loop still running.
+    """
+
+    def __init__(self, service: str, interval: Optional[float] = None, timeout: Optional[float] = None):
+        self.service = service
+        self.interval = interval or float(os.environ.get("HEALTH_CHECK_INTERVAL", "5"))
+        self.timeout = timeout or float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+        # Seconds startup waits for the critical checks to pass (0 = don't wait)
+        self.startup_wait = float(os.environ.get("HEALTH_STARTUP_WAIT", "0"))
+        self.checks: Dict[str, Check] = {}
+        self.critical: Dict[str, bool] = {}
+        self.results: Dict[str, CheckResult] = {}
+        self.started_at = time.time()
+        self.last_probe = 0.0
+        self._task: Optional[asyncio.Task] = None
+        _monitors.append(self)
+
+    def add_check(self, name: str, check: Check, critical: bool = True):
+        self.checks[name] = check
+        self.critical[name] = critical
+
+    async def start(self):
+        """Run one probe round, then keep probing in the background.
+
+        With ``startup_wait`` set, probing repeats until the service is ready
+        or the wait runs out. uvicorn only accepts connections once startup
+        has finished, so a worker takes no traffic before its own /health
+        passes.
+        """
+        if self._task is not None:
+            return
+        await self.probe()
+        deadline = time.monotonic() + self.startup_wait
+        while not self.ready() and time.monotonic() < deadline:
+            await asyncio.sleep(min(self.interval, 1.0))
+            await self.probe()
+        if self.startup_wait and not self.ready():
+            logger.error("%s not healthy after %.0fs, starting anyway", self.service, self.startup_wait)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def probe(self):
+        """Run every check concurrently, each bounded by ``timeout``"""
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(self.checks[name]) for name in names))
+        for name, result in zip(names, results):
+            previous = self.results.get(name)
+            if not result.ok and (previous is None or previous.ok):
+                logger.warning("Health check %s/%s failed: %s", self.service, name, result.error)
+            elif result.ok and previous is not None and not previous.ok:
+                logger.info("Health check %s/%s recovered", self.service, name)
+            self.results[name] = result
+        self.last_probe = time.time()
+
+    async def _run_check(self, check: Check) -> CheckResult:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+            error = None
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout:.1f}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        return CheckResult(error is None, time.perf_counter() - started, error, time.time())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error("Health probe round failed: %s", e)
+
+    def ready(self) -> bool:
+        if not self.results:
+            return False
+        return all(result.ok for name, result in self.results.items() if self.critical[name])
+
+    def liveness(self) -> Dict[str, Any]:
+        probing = self._task is not None and not self._task.done()
+        return {
+            "status": "alive" if probing else "stalled",
+            "service": self.service,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "last_probe_age_seconds": round(time.time() - self.last_probe, 3) if self.last_probe else None,
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        if self.ready():
+            status = "healthy" if all(result.ok for result in self.results.values()) else "degraded"
+        else:
+            status = "unhealthy"
+        return {
+            "status": status,
+            "service": self.service,
+            "dependencies": {
+                name: {
+                    "status": "up" if result.ok else "down",
+                    "critical": self.critical[name],
+                    "latency_ms": round(result.latency * 1000, 3),
+                    "checked_at": result.checked_at,
+                    "error": result.error,
+                }
+                for name, result in self.results.items()
+            },
+        }
+
+    def install(self, app: FastAPI):
+        """Add ``/health``, ``/health/live`` and ``/health/ready`` to an app"""
+
+        async def health():
+            body = self.readiness()
+            return JSONResponse(body, status_code=200 if body["status"] != "unhealthy" else 503)
+
+        async def live():
+            body = self.liveness()
+            return JSONResponse(body, status_code=200 if body["status"] == "alive" else 503)
+
+        app.add_api_route("/health", health, methods=["GET"])
+        app.add_api_route("/health/live", live, methods=["GET"])
+        app.add_api_route("/health/ready", health, methods=["GET"])
+
+
+_monitors: List[HealthMonitor] = []
+
+
+def _dependency_samples():
+    for monitor in _monitors:
+        for name, result in monitor.results.items():
+            yield (monitor.service, name), 1.0 if result.ok else 0.0
+
+
+def _latency_samples():
+    for monitor in _monitors:
+        for name, result in monitor.results.items():
+            yield (monitor.service, name), result.latency
+
+
+HEALTH_UP = CallbackGauge(
+    "health_dependency_up", "Last background probe result (1 up, 0 down)", _dependency_samples,
+    labels=["service", "dependency"],
+)
+HEALTH_LATENCY = CallbackGauge(
+    "health_dependency_latency_seconds", "Latency of the last background probe", _latency_samples,
+    labels=["service", "dependency"],
+)
+
+
+def database_check(database) -> Check:
+    """Round trip through the shared pool; never opens a dedicated connection"""
+
+    async def check():
+        async with database.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+
+    return check
+
+
+def redis_check(queue) -> Check:
+    """Ping Redis over the event bus connection"""
+
+    async def check():
+        if not queue.connected:
+            raise ConnectionError("event bus not connected")
+        await queue.redis_client.ping()
+
+    return check
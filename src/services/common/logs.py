@@ -0,0 +1,213 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from .metrics import Counter
+
+# Correlates every record logged while handling a request
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records not written, by reason", ["logger", "reason"]
+)
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+# (uvicorn adds color_message, a duplicate of the message with ANSI codes)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "color_message"
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed through ``extra``"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id; runs in the caller's context"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger and level for records up to WARNING.
+
+    Records over the budget are dropped and counted; the next record let
+    through from that bucket carries ``suppressed`` with the count. ERROR
+    and above are never dropped.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno > logging.WARNING:
+            return True
+        key = (record.name, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # [tokens, last refill, suppressed since last emitted]
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                LOG_RECORDS_DROPPED.inc(record.name, "rate_limited")
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve arguments now, since they may change before the listener
+        # thread gets to them, but leave all formatting to the listener.
+        # Tracebacks reference live frames, so they are rendered here too.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(record.name, "queue_full")
+
+
+_traceback_formatter = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def configure_logging():
+    """Route all logging through a queue drained by a background thread.
+
+    Callers only filter, stamp and enqueue records; formatting and writing
+    to stderr happen on the listener thread. Settings come from the
+    environment: ``LOG_LEVEL`` (INFO), ``LOG_FORMAT`` (``json`` or
+    ``text``), ``LOG_QUEUE_SIZE`` (10000 records), ``LOG_RATE_LIMIT``
+    (records per second per logger and level, 0 to disable) and
+    ``LOG_RATE_BURST``. Safe to call more than once; the first call wins.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        rate = float(os.environ.get("LOG_RATE_LIMIT", "100"))
+        burst = float(os.environ.get("LOG_RATE_BURST", str(max(rate, 1.0))))
+
+        output = logging.StreamHandler(sys.stderr)
+        if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+        else:
+            output.setFormatter(JsonFormatter())
+
+        handler = NonBlockingQueueHandler(queue.Queue(int(os.environ.get("LOG_QUEUE_SIZE", "10000"))))
+        handler.addFilter(RateLimitFilter(rate, burst))
+        handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+        # uvicorn installs its own synchronous handlers; send its records
+        # (including the per-request access log) through the queue as well
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers.clear()
+            uvicorn_logger.propagate = True
+
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request id for log correlation.
+
+    Uses the caller's ``X-Request-ID`` if present, so one id follows a
+    request across services, and echoes it in the response. Nested apps
+    (composite mode) reuse the id bound by the outer app.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = request_id_var.get()
+        if request_id is None:
+            for name, value in scope["headers"]:
+                if name == REQUEST_ID_HEADER.encode():
+                    request_id = value.decode("latin-1")[:128]
+                    break
+            else:
+                request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if not any(name.lower() == REQUEST_ID_HEADER.encode() for name, _ in headers):
+                    headers.append((REQUEST_ID_HEADER.encode(), request_id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,365 @@
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans sub-millisecond cache hits to slow bulk requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    kind = ""
+    # Across worker processes (see Registry) values are summed, except that
+    # per-worker metrics keep one series per live worker
+    per_worker = False
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def snapshot(self) -> Dict[LabelValues, Any]:
+        """Current value per label set"""
+        raise NotImplementedError
+
+    def combine(self, total: Any, value: Any) -> Any:
+        """Add up one label set's values from two processes"""
+        return total + value
+
+    def samples(self, names: Sequence[str], values: Dict[LabelValues, Any]) -> Iterable[str]:
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(names, labels)} {_number(value)}"
+
+    def render(self, snapshots: Optional[Dict[str, Dict[LabelValues, Any]]] = None) -> str:
+        """Render this process's values, or merge ``snapshots`` from every worker"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if snapshots is None:
+            lines.extend(self.samples(self.label_names, self.snapshot()))
+        elif self.per_worker:
+            values = {
+                labels + (worker,): value
+                for worker, worker_values in snapshots.items()
+                for labels, value in worker_values.items()
+            }
+            lines.extend(self.samples(self.label_names + ("worker",), values))
+        else:
+            values: Dict[LabelValues, Any] = {}
+            for worker_values in snapshots.values():
+                for labels, value in worker_values.items():
+                    values[labels] = self.combine(values[labels], value) if labels in values else value
+            lines.extend(self.samples(self.label_names, values))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    per_worker = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class CallbackGauge(Metric):
+    """Gauge read from existing stats at scrape time, e.g. pool sizes"""
+
+    kind = "gauge"
+    per_worker = True
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        callback: Callable[[], Iterable[Tuple[LabelValues, float]]],
+        labels: Sequence[str] = (),
+        registry: Optional["Registry"] = None,
+    ):
+        self.callback = callback
+        super().__init__(name, help, labels, registry)
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        return {tuple(labels): value for labels, value in self.callback()}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf)], sum
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def snapshot(self) -> Dict[LabelValues, List]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    def combine(self, total: List, value: List) -> List:
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1]]
+
+    def samples(self, names: Sequence[str], values: Dict[LabelValues, List]) -> Iterable[str]:
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(names, labels)} {cumulative}"
+
+
+class Registry:
+    """The metrics of a process, or with ``directory`` of every worker process.
+
+    Each worker process of a service has its own values, and a scrape
+    reaches whichever worker accepts the connection. With ``directory`` set
+    (``METRICS_MULTIPROC_DIR``, one per service) every process writes a
+    snapshot of its values there every ``flush_interval`` seconds and at
+    exit, and ``render`` merges them all: counters and histograms are summed
+    over every worker, exited ones included so totals do not go backwards
+    when a worker is recycled, and gauges get one series per live worker
+    under a ``worker`` label.
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        # Unique per process, even if the OS reuses the pid later
+        self.worker = f"{os.getpid()}-{time.time_ns()}"
+        self._last: Dict[str, Dict[LabelValues, Any]] = {}
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, Dict[LabelValues, Any]]:
+        """Current values of every metric, by name"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                self._last[metric.name] = metric.snapshot()
+            except Exception as e:
+                # A callback read its stats mid-update from the flusher
+                # thread; keep the previous values until the next flush
+                logger.debug("Error reading metric %s: %s", metric.name, e)
+        return dict(self._last)
+
+    def start(self):
+        """Start writing snapshots for the other workers; no-op without a directory"""
+        if self.directory is None or self._flusher is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush()
+        atexit.register(self.flush)
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def flush(self):
+        path = os.path.join(self.directory, f"{self.worker}.json")
+        data = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in self.snapshot().items()
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Error writing metrics snapshot: %s", e)
+
+    def _snapshots(self) -> Dict[str, Dict[str, Dict[LabelValues, Any]]]:
+        """Values by worker, this process's fresh and the others' last flushed"""
+        snapshots = {self.worker: self.snapshot()}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            worker = os.path.basename(path)[:-len(".json")]
+            if worker == self.worker:
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots[worker] = {
+                name: {tuple(labels): value for labels, value in values} for name, values in data.items()
+            }
+        return snapshots
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        if self.directory is None:
+            return "\n".join(metric.render() for metric in metrics) + "\n"
+
+        snapshots = self._snapshots()
+        live = {worker for worker in snapshots if _alive(int(worker.split("-")[0]))}
+        rendered = []
+        for metric in metrics:
+            by_worker = {
+                worker: values[metric.name]
+                for worker, values in snapshots.items()
+                if metric.name in values and (worker in live or not metric.per_worker)
+            }
+            rendered.append(metric.render(by_worker))
+        return "\n".join(rendered) + "\n"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Process-wide registry; in composite mode every mounted app exports it
+REGISTRY = Registry(
+    os.environ.get("METRICS_MULTIPROC_DIR") or None, float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["service", "method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["service", "method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled", ["service"])
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests.
+
+    Requests are labelled by route template (``/users/{user_id}``) rather
+    than raw path so label cardinality stays bounded; unmatched paths share
+    one label.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(self.service)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(self.service)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(elapsed, self.service, method, template)
+            HTTP_REQUESTS.inc(self.service, method, template, str(status))
+
+
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def instrument(app: FastAPI, service: str):
+    """Add request metrics and a ``/metrics`` endpoint to a service app"""
+    REGISTRY.start()
+    app.add_middleware(MetricsMiddleware, service=service)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
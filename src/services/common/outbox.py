@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import asyncpg
+
+from .database import Database, db
+from .events import events
+from .metrics import CallbackGauge, Counter, Histogram
+from ..message_queue.async_queue import AsyncMessageQueue
+from ..message_queue.models import Message
+
+logger = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY channel signalled by the outbox_notify trigger (sql/init.sql)
+CHANNEL = "outbox"
+
+# Published rows older than the retention are deleted at most this often
+PRUNE_INTERVAL = 60.0
+
+OUTBOX_RELAYED = Counter("outbox_events_relayed_total", "Outbox events handed to Redis, by outcome", ["outcome"])
+OUTBOX_LAG = Histogram(
+    "outbox_relay_lag_seconds", "Time from the recording transaction to publication",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+def with_outbox(insert_sql: str, event_type: str, service: str, payload_sql: str) -> str:
+    """Wrap an ``INSERT ... RETURNING`` so it also records one event per row.
+
+    The result is a single statement, so the rows and their events commit
+    together without an explicit transaction or extra round trip.
+    ``payload_sql`` is a JSONB expression over the returned columns, e.g.
+    ``jsonb_build_object('user_id', id)``. It returns the same rows as
+    ``insert_sql``.
+    """
+    return f"""
+        WITH created AS ({insert_sql}),
+        recorded AS (
+            INSERT INTO outbox (event_type, payload, service)
+            SELECT '{event_type}', {payload_sql}, '{service}' FROM created
+        )
+        SELECT * FROM created
+    """
+
+
+async def copy_to_outbox(
+    conn: asyncpg.Connection, event_type: str, service: str, payloads: Iterable[Dict[str, Any]]
+):
+    """COPY one event per payload into the outbox on ``conn``.
+
+    For rows loaded with COPY, which has no ``RETURNING`` to hang
+    ``with_outbox`` on; run it in the transaction that loads them.
+    """
+    await conn.copy_records_to_table(
+        "outbox",
+        records=[(event_type, json.dumps(payload), service) for payload in payloads],
+        columns=["event_type", "payload", "service"],
+    )
+
+
+class OutboxRelay:
+    """Publishes outbox rows to the message queue in batches.
+
+    Woken by ``NOTIFY outbox`` on a dedicated connection, with a slow poll
+    as a fallback when a notification is missed or the listener is down.
+    Each batch is claimed by one short statement that leases its rows for
+    ``claim_timeout`` seconds (picked with ``FOR UPDATE SKIP LOCKED``), so
+    every worker of every service can run a relay; one pipelined
+    ``publish_many`` then sends it with no transaction or row lock held,
+    and a second statement stamps the published rows. Rows whose publish
+    failed are released and retried, as are the rows of a relay that died
+    mid-batch once their lease runs out, so delivery is at least once. The
+    relay is reference counted like the database pool.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        queue: AsyncMessageQueue,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        retention: Optional[float] = None,
+        claim_timeout: Optional[float] = None,
+    ):
+        self.database = database
+        self.queue = queue
+        self.batch_size = batch_size or int(os.environ.get("OUTBOX_BATCH_SIZE", "500"))
+        self.poll_interval = poll_interval or float(os.environ.get("OUTBOX_POLL_INTERVAL", "5"))
+        self.retention = retention or float(os.environ.get("OUTBOX_RETENTION_HOURS", "24")) * 3600
+        self.claim_timeout = claim_timeout or float(os.environ.get("OUTBOX_CLAIM_TIMEOUT", "30"))
+        self._users = 0
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._wake = asyncio.Event()
+        self._last_prune = 0.0
+
+        self.relayed = 0
+        self.failed = 0
+        self.batches = 0
+        self.notifications = 0
+        # Unpublished rows and age of the oldest, as of the last pass
+        self.pending = 0
+        self.oldest_pending_age = 0.0
+
+    async def start(self):
+        self._users += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._users = max(self._users - 1, 0)
+        if self._users or self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    def _notified(self, connection, pid, channel, payload):
+        self.notifications += 1
+        self._wake.set()
+
+    async def _listen(self):
+        """(Re)open the LISTEN connection; polling covers for it meanwhile"""
+        if self._listener is not None and not self._listener.is_closed():
+            return
+        try:
+            self._listener = await asyncpg.connect(self.database.dsn)
+            await self._listener.add_listener(CHANNEL, self._notified)
+        except Exception as e:
+            self._listener = None
+            logger.warning("Outbox LISTEN unavailable, polling every %.0fs: %s", self.poll_interval, e)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._listen()
+                await self.relay()
+                await self._measure()
+                if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    await self._prune()
+            except Exception as e:
+                logger.error("Outbox relay pass failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def relay(self) -> int:
+        """Publish pending events until none are left; returns how many were sent"""
+        sent_total = 0
+        while self.queue.connected:
+            async with self.database.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    UPDATE outbox SET claimed_until = clock_timestamp() + make_interval(secs => $2)
+                    WHERE id IN (
+                        SELECT id FROM outbox
+                        WHERE published_at IS NULL
+                          AND (claimed_until IS NULL OR claimed_until < clock_timestamp())
+                        ORDER BY id
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, event_type, payload, service, created_at
+                    """,
+                    self.batch_size, self.claim_timeout
+                )
+            if not rows:
+                break
+            rows.sort(key=lambda row: row["id"])
+
+            results = await self.queue.publish_many(_message(row) for row in rows)
+            sent = [row["id"] for row, ok in zip(rows, results) if ok]
+            unsent = [row["id"] for row, ok in zip(rows, results) if not ok]
+            lags = []
+            async with self.database.acquire() as conn:
+                if sent:
+                    lags = await conn.fetch(
+                        """
+                        UPDATE outbox SET published_at = clock_timestamp(), claimed_until = NULL
+                        WHERE id = ANY($1::bigint[])
+                        RETURNING extract(epoch FROM published_at - created_at)::float8 AS lag
+                        """,
+                        sent
+                    )
+                if unsent:
+                    # Up for the next pass of any relay rather than after the lease
+                    await conn.execute(
+                        "UPDATE outbox SET claimed_until = NULL WHERE id = ANY($1::bigint[])", unsent
+                    )
+
+            self.batches += 1
+            self.relayed += len(sent)
+            self.failed += len(rows) - len(sent)
+            OUTBOX_RELAYED.inc("ok", amount=len(sent))
+            if len(sent) < len(rows):
+                OUTBOX_RELAYED.inc("error", amount=len(rows) - len(sent))
+            for row in lags:
+                OUTBOX_LAG.observe(row["lag"])
+            sent_total += len(sent)
+
+            if len(sent) < len(rows):
+                # Redis is failing; retry on the next wake-up rather than spin
+                break
+        return sent_total
+
+    async def _measure(self):
+        async with self.database.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT count(*) AS pending,
+                       coalesce(extract(epoch FROM clock_timestamp() - min(created_at)), 0)::float8 AS oldest
+                FROM outbox
+                WHERE published_at IS NULL
+                """
+            )
+        self.pending = row["pending"]
+        self.oldest_pending_age = row["oldest"]
+
+    async def _prune(self):
+        async with self.database.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM outbox WHERE published_at < clock_timestamp() - make_interval(secs => $1)",
+                self.retention
+            )
+        self._last_prune = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "listening": self._listener is not None and not self._listener.is_closed(),
+            "relayed": self.relayed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "notifications": self.notifications,
+            "pending": self.pending,
+            "oldest_pending_age_seconds": round(self.oldest_pending_age, 3),
+        }
+
+
+def _message(row) -> Message:
+    return Message(
+        event_type=row["event_type"],
+        payload=json.loads(row["payload"]),
+        service=row["service"],
+        # Message timestamps are naive UTC
+        timestamp=row["created_at"].replace(tzinfo=None),
+    )
+
+
+# Process-wide relay shared by every service
+outbox = OutboxRelay(db, events)
+
+OUTBOX_PENDING = CallbackGauge(
+    "outbox_pending_events", "Unpublished outbox events as of the last relay pass", lambda: [((), outbox.pending)]
+)
+OUTBOX_OLDEST = CallbackGauge(
+    "outbox_oldest_pending_age_seconds", "Age of the oldest unpublished outbox event",
+    lambda: [((), outbox.oldest_pending_age)],
+)
@@ -0,0 +1,99 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+
+import asyncpg
+from fastapi import Request, Response
+
+from .database import Database
+
+# Bounds for the ``limit`` query parameter on list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched from the server-side cursor per streamed chunk
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row into an opaque, URL-safe cursor"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Unpack a cursor produced by ``encode_cursor``; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def set_next_page(request: Request, response: Response, next_cursor: Optional[str], limit: int):
+    """Advertise the next page through ``X-Next-Cursor`` and an RFC 8288 ``Link`` header"""
+    if next_cursor is None:
+        return
+    next_url = request.url.include_query_params(after=next_cursor, limit=limit)
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+def _json_rows(query: str, order_by: str) -> str:
+    # SQL only guarantees the order of the outermost query, so repeat the
+    # subquery's ordering there rather than rely on the plan preserving it
+    return f"SELECT row_to_json(r)::text AS doc FROM ({query}) r ORDER BY {order_by}"
+
+
+async def fetch_json_rows(conn: asyncpg.Connection, query: str, *args: Any, order_by: str) -> bytes:
+    """Fetch every row of ``query`` as a JSON array encoded by Postgres.
+
+    ``order_by`` is the ORDER BY clause of ``query``, over its output columns.
+    """
+    rows = await conn.fetch(_json_rows(query, order_by), *args)
+    return ("[" + ",".join(row["doc"] for row in rows) + "]").encode()
+
+
+async def fetch_json_page(
+    conn: asyncpg.Connection,
+    query: str,
+    *args: Any,
+    limit: int,
+    cursor_columns: Sequence[str],
+    order_by: str,
+) -> Tuple[bytes, Optional[str]]:
+    """Fetch one keyset page as a JSON array encoded by Postgres.
+
+    ``query`` must be ordered by ``order_by``, an ORDER BY clause over
+    ``cursor_columns``. Each row comes back as JSON text from
+    ``row_to_json``, so the service only joins strings instead of building
+    dicts and encoding them. Returns the body and the cursor for the next
+    page, or None on the last page.
+    """
+    columns = ", ".join(f"r.{column}" for column in cursor_columns)
+    rows = await conn.fetch(
+        f"SELECT row_to_json(r)::text AS doc, {columns} FROM ({query} LIMIT ${len(args) + 1}) r ORDER BY {order_by}",
+        *args, limit + 1
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*(rows[-1][column] for column in cursor_columns))
+    body = "[" + ",".join(row["doc"] for row in rows) + "]"
+    return body.encode(), next_cursor
+
+
+async def stream_ndjson(database: Database, query: str, *args: Any, order_by: str) -> AsyncIterator[bytes]:
+    """Stream query results, ordered by ``order_by``, as NDJSON from a server-side cursor in constant memory"""
+    async with database.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            cursor = await conn.cursor(_json_rows(query, order_by), *args)
+            while True:
+                rows = await cursor.fetch(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield "".join(row["doc"] + "\n" for row in rows).encode()
@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import os
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is offered instead
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+# Bodies at least this large are compressed on a worker thread (zlib and
+# brotli release the GIL) so the event loop keeps serving other requests
+COMPRESS_THREAD_BYTES = 64 * 1024
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+async def json_bytes_response(request: Request, body: bytes, status_code: int = 200) -> Response:
+    """Send an already-encoded JSON body, compressed if the client accepts it.
+
+    Skips FastAPI's ``jsonable_encoder`` and ``json.dumps`` entirely; use it
+    for bodies built by Postgres or cached in encoded form.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        if len(body) >= COMPRESS_THREAD_BYTES:
+            body = await asyncio.to_thread(_compress, body, encoding)
+        else:
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,60 @@
+import os
+from typing import Any, Dict
+
+import httpx
+
+from .logs import REQUEST_ID_HEADER, request_id_var
+
+# Where each service listens when it runs as its own process
+SERVICE_URLS = {
+    "users": os.environ.get("USER_SERVICE_URL", "http://localhost:8001"),
+    "products": os.environ.get("PRODUCT_SERVICE_URL", "http://localhost:8002"),
+    "github": os.environ.get("GITHUB_SERVICE_URL", "http://localhost:8003"),
+}
+
+# Apps running in this process (composite mode), keyed like SERVICE_URLS
+_local_apps: Dict[str, Any] = {}
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def register_local_app(name: str, app: Any):
+    """Route calls to ``name`` straight into ``app`` instead of over the network"""
+    _local_apps[name] = app
+    _clients.pop(name, None)
+
+
+async def _propagate_request_id(request: httpx.Request):
+    request_id = request_id_var.get()
+    if request_id is not None and REQUEST_ID_HEADER not in request.headers:
+        request.headers[REQUEST_ID_HEADER] = request_id
+
+
+def service_client(name: str) -> httpx.AsyncClient:
+    """Shared client for calling another service.
+
+    In composite mode requests are handed to the mounted app in-process;
+    otherwise they go over HTTP on a keep-alive connection pool. The
+    current request id is forwarded so logs correlate across services.
+    """
+    hooks = {"request": [_propagate_request_id]}
+    client = _clients.get(name)
+    if client is None:
+        if name in _local_apps:
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=_local_apps[name]),
+                base_url=f"http://{name}",
+                event_hooks=hooks
+            )
+        elif name in SERVICE_URLS:
+            client = httpx.AsyncClient(base_url=SERVICE_URLS[name], timeout=10.0, event_hooks=hooks)
+        else:
+            raise ValueError(f"Unknown service: {name}")
+        _clients[name] = client
+    return client
+
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,71 @@
+from contextlib import AsyncExitStack, asynccontextmanager
+import logging
+import os
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+import uvicorn
+from ..common.logs import RequestIdMiddleware, configure_logging
+from ..common.metrics import metrics_endpoint
+from ..common.service_client import close_clients, register_local_app
+from ..user_service.main import app as user_app, health as user_health
+from ..product_service.main import app as product_app, health as product_health
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Mount prefix and service_client name for each app
+MOUNTS = [
+    ("/user", "users", user_app),
+    ("/product", "products", product_app),
+]
+MONITORS = [user_health, product_health]
+
+# The GitHub service refuses to start without OAuth credentials; leave it
+# out of small deployments that do not configure them
+if os.environ.get('GITHUB_CLIENT_ID') and os.environ.get('GITHUB_CLIENT_SECRET'):
+    from ..github_service.main import app as github_app, health as github_health
+    MOUNTS.append(("/github", "github", github_app))
+    MONITORS.append(github_health)
+else:
+    logger.warning("GitHub OAuth credentials not configured, not mounting the GitHub service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mounted apps do not get lifespan events, so run each one's here. They
+    # share the process-wide db pool, event bus and GitHub session, which
+    # are opened once and closed after the last app shuts down.
+    async with AsyncExitStack() as stack:
+        for _, _, mounted in MOUNTS:
+            await stack.enter_async_context(mounted.router.lifespan_context(mounted))
+        yield
+        await close_clients()
+
+app = FastAPI(title="Microservices Platform", lifespan=lifespan)
+
+for prefix, name, mounted in MOUNTS:
+    app.mount(prefix, mounted)
+    register_local_app(name, mounted)
+
+# Bind the request id once so every mounted app logs under the same one
+app.add_middleware(RequestIdMiddleware)
+
+# Mounted apps record their own requests; this exports everything at the root too
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint, combining every mounted service's cached probes"""
+    services = {monitor.service: monitor.readiness() for monitor in MONITORS}
+    statuses = {body["status"] for body in services.values()}
+    if "unhealthy" in statuses:
+        status = "unhealthy"
+    elif "degraded" in statuses:
+        status = "degraded"
+    else:
+        status = "healthy"
+    body = {"status": status, "services": services}
+    return JSONResponse(body, status_code=503 if status == "unhealthy" else 200)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get('PORT', '8000')))
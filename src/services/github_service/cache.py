@@ -0,0 +1,134 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..common.metrics import CallbackGauge, Counter
+
+CACHE_LOOKUPS = Counter(
+    "github_cache_lookups_total", "Conditional cache lookups, by result (hit, miss, expired)", ["result"]
+)
+CACHE_NOT_MODIFIED = Counter("github_cache_not_modified_total", "Cached GitHub responses revalidated by a 304")
+CACHE_EVICTIONS = Counter("github_cache_evictions_total", "Entries evicted to stay within the cache limits")
+
+
+def token_fingerprint(access_token: str) -> str:
+    """Stable identifier for a token that does not keep the token itself in memory"""
+    return hashlib.sha256(access_token.encode()).hexdigest()[:32]
+
+
+class CachedResponse:
+    """A parsed GitHub response plus the validators needed to revalidate it"""
+
+    __slots__ = ("value", "etag", "last_modified", "size", "expires_at")
+
+    def __init__(self, value: Any, etag: Optional[str], last_modified: Optional[str], size: int, expires_at: float):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ConditionalCache:
+    """Per-token LRU/TTL cache of GitHub GET responses keyed by URL.
+
+    Entries keep the parsed models together with ``ETag``/``Last-Modified``
+    so a ``304 Not Modified`` is answered from memory without re-validating
+    anything. Memory use is bounded by ``max_bytes``, measured as the size
+    of the response bodies.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.max_entries = max_entries or int(os.environ.get('GITHUB_CACHE_ENTRIES', '1000'))
+        self.ttl = ttl or float(os.environ.get('GITHUB_CACHE_TTL', '300'))
+        self.max_bytes = max_bytes or int(os.environ.get('GITHUB_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.bytes = 0
+
+        # Counters
+        self.lookups = 0
+        self.hits = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.expirations = 0
+        _caches.append(self)
+
+    @staticmethod
+    def key(access_token: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        token = token_fingerprint(access_token)
+        query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return f"{token} {url}?{query}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        self.lookups += 1
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_LOOKUPS.inc("miss")
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            CACHE_LOOKUPS.inc("expired")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        CACHE_LOOKUPS.inc("hit")
+        return entry
+
+    def set(self, key: str, value: Any, etag: Optional[str], last_modified: Optional[str], size: int):
+        if not etag and not last_modified:
+            return
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedResponse(value, etag, last_modified, size, time.monotonic() + self.ttl)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+            CACHE_EVICTIONS.inc()
+
+    def refresh(self, entry: CachedResponse):
+        """Record a 304 for an entry and extend its lifetime"""
+        self.not_modified += 1
+        CACHE_NOT_MODIFIED.inc()
+        entry.expires_at = time.monotonic() + self.ttl
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_caches: List[ConditionalCache] = []
+
+CACHE_ENTRIES = CallbackGauge(
+    "github_cache_entries", "Responses held by the conditional cache",
+    lambda: [((), sum(len(cache._entries) for cache in _caches))],
+)
+CACHE_BYTES = CallbackGauge(
+    "github_cache_bytes", "Response body bytes held by the conditional cache",
+    lambda: [((), sum(cache.bytes for cache in _caches))],
+)
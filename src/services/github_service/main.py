@@ -1,15 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List
 import uvicorn
 from .service import GitHubService
+from ..common.health import HealthMonitor
+from ..common.logs import RequestIdMiddleware, configure_logging
+from ..common.metrics import instrument
 from .models import GitHubAuthResponse, GitHubUser, Repository
 import logging
 import secrets
 
-app = FastAPI(title="GitHub Integration Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await github_service.start()
+    await health.start()
+    yield
+    await health.stop()
+    await github_service.close()
+
+app = FastAPI(title="GitHub Integration Service", lifespan=lifespan)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # CORS middleware
@@ -21,13 +35,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics and /metrics
+instrument(app, "github_service")
+
+# Request ids for log correlation
+app.add_middleware(RequestIdMiddleware)
+
 # Create GitHub service instance
 github_service = GitHubService()
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
+# /health, /health/live and /health/ready, answered from background probes
+health = HealthMonitor("github_service")
+health.add_check("github", github_service.ping, critical=False)
+health.install(app)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Conditional request cache statistics"""
+    return github_service.cache.stats()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Upstream request coalescing and rate-limit budget statistics"""
+    return github_service.scheduler.stats()
 
 @app.get("/oauth/url")
 async def get_oauth_url():
@@ -38,7 +68,7 @@ async def get_oauth_url():
         url = github_service.get_oauth_url(state)
         return {"url": url, "state": state}
     except Exception as e:
-        logger.error(f"Error generating OAuth URL: {str(e)}")
+        logger.error("Error generating OAuth URL: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/oauth/callback")
@@ -51,20 +81,62 @@ async def oauth_callback(code: str, state: str):
             "token": token,
             "user": user
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in OAuth callback: {str(e)}")
+        logger.error("Error in OAuth callback: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/repositories")
-async def list_repositories(access_token: str):
-    """List repositories for authenticated user"""
+async def list_repositories(access_token: str, stream: bool = False):
+    """List repositories for authenticated user.
+
+    With ``stream=true`` repositories are sent as NDJSON as each page
+    arrives from GitHub instead of after the whole list is fetched.
+    """
+    if stream:
+        pages = github_service.iter_repository_pages(access_token)
+        try:
+            # Fetch the first page up front so upstream errors still map to a status
+            first_page = await pages.__anext__()
+        except HTTPException:
+            await pages.aclose()
+            raise
+        except Exception as e:
+            await pages.aclose()
+            logger.error("Error listing repositories: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
+        return StreamingResponse(
+            _stream_repositories(first_page, pages),
+            media_type="application/x-ndjson"
+        )
+
     try:
         repos = await github_service.list_repositories(access_token)
         return repos
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error listing repositories: {str(e)}")
+        logger.error("Error listing repositories: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _stream_repositories(
+    first_page: List[Repository],
+    pages: AsyncIterator[List[Repository]]
+) -> AsyncIterator[bytes]:
+    try:
+        yield "".join(repo.model_dump_json() + "\n" for repo in first_page).encode()
+        async for page in pages:
+            yield "".join(repo.model_dump_json() + "\n" for repo in page).encode()
+    except Exception as e:
+        # Headers are already sent; re-raise so the server aborts the
+        # response instead of ending it cleanly, and the client can tell
+        # a truncated list from a complete one
+        logger.error("Error streaming repositories: %s", e)
+        raise
+    finally:
+        await pages.aclose()
+
 @app.post("/repositories")
 async def create_repository(
     access_token: str,
@@ -81,8 +153,10 @@ async def create_repository(
             description=description
         )
         return repo
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error creating repository: {str(e)}")
+        logger.error("Error creating repository: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from fastapi import HTTPException
+
+from ..common.metrics import CallbackGauge, Counter, Histogram
+from .cache import token_fingerprint
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_WAIT = Histogram(
+    "github_rate_limit_wait_seconds", "Time a GitHub call waited for its token's budget",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+RATE_LIMIT_REJECTED = Counter(
+    "github_rate_limit_rejected_total", "GitHub calls refused because the budget allowed none within the max wait"
+)
+UPSTREAM_THROTTLED = Counter("github_upstream_throttled_total", "Rate-limit (403/429) responses from GitHub")
+REQUESTS_COALESCED = Counter("github_requests_coalesced_total", "GitHub reads served by another caller's in-flight call")
+
+
+class RateLimitExceeded(HTTPException):
+    """A token has no budget left for longer than the scheduler may wait"""
+
+    def __init__(self, retry_after: float):
+        seconds = max(math.ceil(retry_after), 1)
+        super().__init__(
+            status_code=429,
+            detail="GitHub rate limit exhausted for this token, retry later",
+            headers={"Retry-After": str(seconds)},
+        )
+        self.retry_after = seconds
+
+
+class RateLimit:
+    """GitHub's view of one token's budget, updated from every response"""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.lock = asyncio.Lock()
+        self.queued = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in_seconds": round(max(self.reset_at - time.time(), 0.0), 1),
+            "queued": self.queued,
+        }
+
+
+class RequestScheduler:
+    """Coalesces identical GitHub reads and paces calls per token.
+
+    ``coalesce`` runs one upstream call per key and hands its result to
+    every concurrent caller (single-flight). ``acquire`` is awaited before
+    each upstream call: once a token is below ``pace_fraction`` of its limit
+    the remaining calls are spread evenly until the reset, and at
+    ``reserve`` or fewer calls left they wait for the reset outright. A call
+    that would wait longer than ``max_wait`` in total raises
+    ``RateLimitExceeded`` (429 with Retry-After) instead, without holding
+    up the token's other calls.
+    """
+
+    def __init__(
+        self,
+        reserve: Optional[int] = None,
+        pace_fraction: Optional[float] = None,
+        max_wait: Optional[float] = None,
+        max_tokens: int = 10000,
+    ):
+        self.reserve = reserve if reserve is not None else int(os.environ.get('GITHUB_RATE_LIMIT_RESERVE', '5'))
+        self.pace_fraction = (
+            pace_fraction if pace_fraction is not None
+            else float(os.environ.get('GITHUB_RATE_LIMIT_PACE_FRACTION', '0.1'))
+        )
+        self.max_wait_seconds = (
+            max_wait if max_wait is not None else float(os.environ.get('GITHUB_RATE_LIMIT_MAX_WAIT', '10'))
+        )
+        self.max_tokens = max_tokens
+        self._limits: "OrderedDict[str, RateLimit]" = OrderedDict()
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+        # Counters
+        self.requests = 0
+        self.coalesced = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.rejected = 0
+        _schedulers.append(self)
+
+    async def coalesce(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Share one in-flight call between every caller with the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            REQUESTS_COALESCED.inc()
+        # Shielded so one caller going away does not cancel the others' call
+        return await asyncio.shield(task)
+
+    async def acquire(self, access_token: Optional[str]):
+        """Wait until the token's budget allows another upstream call.
+
+        Raises RateLimitExceeded when that would take more than ``max_wait``,
+        whether waiting behind the token's other calls or for its budget.
+        """
+        self.requests += 1
+        if access_token is None:
+            return
+        state = self._state(access_token)
+        # Fail fast, without queueing on the lock, when the budget is gone
+        delay = self._delay(state)
+        if delay > self.max_wait_seconds:
+            self._reject(delay)
+
+        state.queued += 1
+        started = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(state.lock.acquire(), self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self._reject(self._delay(state))
+            try:
+                delay = self._delay(state)
+                if time.perf_counter() - started + delay > self.max_wait_seconds:
+                    self._reject(delay)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if state.remaining is not None:
+                    state.remaining = max(state.remaining - 1, 0)
+            finally:
+                state.lock.release()
+        finally:
+            state.queued -= 1
+            waited = time.perf_counter() - started
+            RATE_LIMIT_WAIT.observe(waited)
+            if waited > 0.001:
+                self.waits += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def _reject(self, retry_after: float):
+        self.rejected += 1
+        RATE_LIMIT_REJECTED.inc()
+        raise RateLimitExceeded(retry_after)
+
+    def update(self, access_token: Optional[str], status: int, headers: Mapping[str, str]):
+        """Record the rate-limit headers of an upstream response"""
+        if access_token is None:
+            return
+        state = self._state(access_token)
+        try:
+            if 'X-RateLimit-Limit' in headers:
+                state.limit = int(headers['X-RateLimit-Limit'])
+            if 'X-RateLimit-Remaining' in headers:
+                state.remaining = int(headers['X-RateLimit-Remaining'])
+            if 'X-RateLimit-Reset' in headers:
+                state.reset_at = float(headers['X-RateLimit-Reset'])
+            if status in (403, 429) and ('Retry-After' in headers or state.remaining == 0):
+                self.throttled += 1
+                UPSTREAM_THROTTLED.inc()
+                state.remaining = 0
+                if 'Retry-After' in headers:
+                    state.reset_at = max(state.reset_at, time.time() + float(headers['Retry-After']))
+        except ValueError:
+            logger.warning("Ignoring malformed GitHub rate-limit headers")
+
+    def _delay(self, state: RateLimit) -> float:
+        if state.remaining is None:
+            return 0.0
+        until_reset = state.reset_at - time.time()
+        if until_reset <= 0:
+            # The window has rolled over; the next response refreshes the numbers
+            state.remaining = None
+            return 0.0
+        if state.remaining <= self.reserve:
+            return until_reset
+        if state.limit and state.remaining < state.limit * self.pace_fraction:
+            return until_reset / (state.remaining - self.reserve)
+        return 0.0
+
+    def _state(self, access_token: str) -> RateLimit:
+        key = token_fingerprint(access_token)
+        state = self._limits.get(key)
+        if state is None:
+            state = self._limits[key] = RateLimit()
+            if len(self._limits) > self.max_tokens:
+                self._limits.popitem(last=False)
+        else:
+            self._limits.move_to_end(key)
+        return state
+
+    def _forget(self, key: Any, done: asyncio.Future):
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+        if not done.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            done.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "queue_waits": self.waits,
+            "avg_wait_ms": round(self.total_wait / self.waits * 1000, 3) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "queued": sum(state.queued for state in self._limits.values()),
+            # Most recently used tokens, identified by a fingerprint prefix
+            "tokens": {key[:8]: state.as_dict() for key, state in list(self._limits.items())[-50:]},
+        }
+
+    def lowest_remaining(self) -> Optional[int]:
+        """Smallest known remaining budget across tracked tokens"""
+        known = [state.remaining for state in self._limits.values() if state.remaining is not None]
+        return min(known) if known else None
+
+
+_schedulers: List[RequestScheduler] = []
+
+
+def _budget_samples():
+    for scheduler in _schedulers:
+        remaining = scheduler.lowest_remaining()
+        if remaining is not None:
+            yield (), remaining
+
+
+RATE_LIMIT_QUEUED = CallbackGauge(
+    "github_rate_limit_queued_calls", "GitHub calls waiting for their token's budget",
+    lambda: [((), sum(state.queued for scheduler in _schedulers for state in scheduler._limits.values()))],
+)
+RATE_LIMIT_LOWEST_REMAINING = CallbackGauge(
+    "github_rate_limit_lowest_remaining", "Smallest remaining GitHub budget across tracked tokens", _budget_samples
+)
+RATE_LIMIT_TOKENS = CallbackGauge(
+    "github_rate_limit_tracked_tokens", "Tokens with a tracked GitHub budget",
+    lambda: [((), sum(len(scheduler._limits) for scheduler in _schedulers))],
+)
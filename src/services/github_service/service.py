@@ -1,19 +1,224 @@
+import asyncio
+import json
 import os
+import random
+import re
+import time
 import aiohttp
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, AsyncIterator
+from urllib.parse import parse_qs, urlparse
 from fastapi import HTTPException
+from ..common.metrics import Counter, Histogram
+from .cache import ConditionalCache
+from .scheduler import RequestScheduler
 from .models import GitHubAuthResponse, GitHubUser, Repository
 
+# Upstream responses worth retrying for idempotent requests
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# GitHub's maximum page size for repository listings
+REPOS_PER_PAGE = 100
+
+LINK_LAST = re.compile(r'<([^>]+)>\s*;\s*rel="last"')
+
+UPSTREAM_SECONDS = Histogram(
+    "github_upstream_duration_seconds", "GitHub API call latency, per attempt", ["method", "endpoint"]
+)
+UPSTREAM_RESPONSES = Counter(
+    "github_upstream_responses_total", "GitHub API responses by status ('error' for no response)",
+    ["method", "endpoint", "status"]
+)
+
+def _json_body(body: bytes) -> Any:
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+def _last_page(link: Optional[str], page: int) -> int:
+    """Page number of the rel="last" link, or ``page`` when there is none"""
+    match = LINK_LAST.search(link or '')
+    if match is None:
+        return page
+    try:
+        return int(parse_qs(urlparse(match.group(1)).query)['page'][0])
+    except (KeyError, ValueError):
+        return page
+
 class GitHubService:
     def __init__(self):
         self.client_id = os.environ.get('GITHUB_CLIENT_ID')
         self.client_secret = os.environ.get('GITHUB_CLIENT_SECRET')
-        self.base_url = "https://api.github.com"
-        self.oauth_url = "https://github.com/login/oauth"
+        self.base_url = os.environ.get('GITHUB_API_URL', "https://api.github.com")
+        self.oauth_url = os.environ.get('GITHUB_OAUTH_URL', "https://github.com/login/oauth")
+
+        # HTTP client tuning
+        self.connection_limit = int(os.environ.get('GITHUB_HTTP_CONNECTIONS', '100'))
+        self.connections_per_host = int(os.environ.get('GITHUB_HTTP_CONNECTIONS_PER_HOST', '20'))
+        self.keepalive_timeout = float(os.environ.get('GITHUB_HTTP_KEEPALIVE', '30'))
+        self.dns_cache_ttl = int(os.environ.get('GITHUB_HTTP_DNS_TTL', '300'))
+        self.timeout = aiohttp.ClientTimeout(
+            total=float(os.environ.get('GITHUB_HTTP_TIMEOUT', '15')),
+            connect=float(os.environ.get('GITHUB_HTTP_CONNECT_TIMEOUT', '5'))
+        )
+        self.max_retries = int(os.environ.get('GITHUB_HTTP_RETRIES', '3'))
+        self.retry_backoff = float(os.environ.get('GITHUB_HTTP_RETRY_BACKOFF', '0.2'))
+
+        # Repository pagination
+        self.page_concurrency = int(os.environ.get('GITHUB_PAGE_CONCURRENCY', '4'))
+        self.max_pages = int(os.environ.get('GITHUB_MAX_PAGES', '100'))
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Per-token ETag/Last-Modified cache for GET requests
+        self.cache = ConditionalCache()
+        # Single-flight and per-token rate-limit pacing for upstream calls
+        self.scheduler = RequestScheduler()
 
         if not self.client_id or not self.client_secret:
             raise ValueError("GitHub OAuth credentials not configured")
 
+    async def start(self):
+        """Open the shared keep-alive session; called from the app lifespan"""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connections_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        """Close the shared session and its pooled connections"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _headers(self, access_token: str) -> Dict[str, str]:
+        return {
+            'Authorization': f'Bearer {access_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+
+    async def _fetch(
+        self,
+        method: str,
+        url: str,
+        retry: bool = False,
+        access_token: Optional[str] = None,
+        **kwargs
+    ) -> tuple[int, bytes, Any]:
+        """Send a request on the shared session and return (status, body, headers).
+
+        With ``retry`` (idempotent calls only), connection errors, timeouts
+        and 429/5xx gateway responses are retried with jittered exponential
+        backoff. Calls made with ``access_token`` are paced by the token's
+        rate-limit budget.
+        """
+        if self.session is None:
+            await self.start()
+
+        endpoint = urlparse(url).path
+        attempt = 0
+        while True:
+            retryable = retry and attempt < self.max_retries
+            await self.scheduler.acquire(access_token)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    status = str(response.status)
+                    self.scheduler.update(access_token, response.status, response.headers)
+                    if not (retryable and response.status in RETRY_STATUSES):
+                        return response.status, await response.read(), response.headers
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not retryable:
+                    raise
+            finally:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, method, endpoint)
+                UPSTREAM_RESPONSES.inc(method, endpoint, status)
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        retry: bool = False,
+        access_token: Optional[str] = None,
+        **kwargs
+    ) -> tuple[int, Any]:
+        """Send a request and return (status, JSON body or None)"""
+        status, body, _ = await self._fetch(method, url, retry=retry, access_token=access_token, **kwargs)
+        return status, _json_body(body)
+
+    async def _get_cached(
+        self,
+        url: str,
+        access_token: str,
+        parse: Callable[[Any, Any], Any],
+        error: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """GET through the conditional cache.
+
+        Cached responses are revalidated with ``If-None-Match`` /
+        ``If-Modified-Since``; on 304 the previously parsed models are
+        returned as is. ``parse(data, headers)`` builds the models from a fresh
+        200 response. Concurrent identical calls share one upstream request.
+        """
+        key = self.cache.key(access_token, url, params)
+        return await self.scheduler.coalesce(
+            key, lambda: self._revalidate(key, url, access_token, parse, error, params)
+        )
+
+    async def _revalidate(
+        self,
+        key: str,
+        url: str,
+        access_token: str,
+        parse: Callable[[Any, Any], Any],
+        error: str,
+        params: Optional[Dict[str, Any]]
+    ) -> Any:
+        entry = self.cache.get(key)
+        headers = self._headers(access_token)
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        status, body, response_headers = await self._fetch(
+            'GET', url, retry=True, access_token=access_token, headers=headers, params=params
+        )
+        if status == 304 and entry is not None:
+            self.cache.refresh(entry)
+            return entry.value
+        if status != 200:
+            raise HTTPException(status_code=status, detail=error)
+
+        value = parse(_json_body(body), response_headers)
+        self.cache.set(
+            key,
+            value,
+            etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified'),
+            size=len(body)
+        )
+        return value
+
+    async def ping(self):
+        """Check that the GitHub API answers.
+
+        Uses /rate_limit, which does not count against any rate limit.
+        """
+        status, _, _ = await self._fetch('GET', f"{self.base_url}/rate_limit")
+        if status >= 500:
+            raise ConnectionError(f"GitHub API returned {status}")
+
     def get_oauth_url(self, state: str) -> str:
         """Generate GitHub OAuth authorization URL"""
         params = {
@@ -27,60 +232,80 @@ class GitHubService:
 
     async def exchange_code_for_token(self, code: str) -> GitHubAuthResponse:
         """Exchange OAuth code for access token"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.oauth_url}/access_token",
-                headers={'Accept': 'application/json'},
-                data={
-                    'client_id': self.client_id,
-                    'client_secret': self.client_secret,
-                    'code': code
-                }
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Failed to exchange code for token"
-                    )
-                data = await response.json()
-                return GitHubAuthResponse(**data)
+        status, data = await self._request(
+            'POST',
+            f"{self.oauth_url}/access_token",
+            headers={'Accept': 'application/json'},
+            data={
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'code': code
+            }
+        )
+        if status != 200:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to exchange code for token"
+            )
+        return GitHubAuthResponse(**data)
 
     async def get_user(self, access_token: str) -> GitHubUser:
         """Get authenticated user's information"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/user",
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Accept': 'application/vnd.github.v3+json'
-                }
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail="Failed to fetch user information"
-                    )
-                data = await response.json()
-                return GitHubUser(**data)
+        return await self._get_cached(
+            f"{self.base_url}/user",
+            access_token,
+            lambda data, headers: GitHubUser(**data),
+            "Failed to fetch user information"
+        )
+
+    async def _repository_page(self, access_token: str, page: int) -> tuple[list[Repository], int]:
+        """Fetch one page of repositories and the last page number from its Link header"""
+        return await self._get_cached(
+            f"{self.base_url}/user/repos",
+            access_token,
+            lambda data, headers: (
+                [Repository(**repo) for repo in data],
+                _last_page(headers.get('Link'), page)
+            ),
+            "Failed to fetch repositories",
+            params={'sort': 'updated', 'per_page': REPOS_PER_PAGE, 'page': page}
+        )
+
+    async def iter_repository_pages(self, access_token: str) -> AsyncIterator[list[Repository]]:
+        """Yield every page of repositories in order.
+
+        The first page's Link header gives the page count; the remaining
+        pages are fetched concurrently, at most ``page_concurrency`` at a
+        time, and yielded in order as soon as each is available.
+        """
+        repos, last_page = await self._repository_page(access_token, 1)
+        yield repos
+        last_page = min(last_page, self.max_pages)
+        if last_page <= 1:
+            return
+
+        limit = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(page: int) -> list[Repository]:
+            async with limit:
+                repos, _ = await self._repository_page(access_token, page)
+                return repos
+
+        tasks = [asyncio.create_task(fetch(page)) for page in range(2, last_page + 1)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def list_repositories(self, access_token: str) -> list[Repository]:
-        """List repositories accessible to the authenticated user"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/user/repos",
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Accept': 'application/vnd.github.v3+json'
-                },
-                params={'sort': 'updated', 'per_page': 100}
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail="Failed to fetch repositories"
-                    )
-                data = await response.json()
-                return [Repository(**repo) for repo in data]
+        """List all repositories accessible to the authenticated user"""
+        repos: list[Repository] = []
+        async for page in self.iter_repository_pages(access_token):
+            repos.extend(page)
+        return repos
 
     async def create_repository(
         self, 
@@ -90,24 +315,21 @@ class GitHubService:
         description: Optional[str] = None
     ) -> Repository:
         """Create a new repository"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/user/repos",
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Accept': 'application/vnd.github.v3+json'
-                },
-                json={
-                    'name': name,
-                    'private': private,
-                    'description': description,
-                    'auto_init': True
-                }
-            ) as response:
-                if response.status != 201:
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail="Failed to create repository"
-                    )
-                data = await response.json()
-                return Repository(**data)
\ No newline at end of file
+        status, data = await self._request(
+            'POST',
+            f"{self.base_url}/user/repos",
+            access_token=access_token,
+            headers=self._headers(access_token),
+            json={
+                'name': name,
+                'private': private,
+                'description': description,
+                'auto_init': True
+            }
+        )
+        if status != 201:
+            raise HTTPException(
+                status_code=status,
+                detail="Failed to create repository"
+            )
+        return Repository(**data)
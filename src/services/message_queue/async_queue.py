@@ -0,0 +1,279 @@
+import asyncio
+import inspect
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import redis.asyncio as aioredis
+
+from .codecs import Codec, Wire, decode_message, encode_message, get_codec
+from .instrumentation import record_handled, record_published
+from .models import Message
+from .queue_service import _encode_each, _is_pattern, _record_batch, _text
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[Message], Union[None, Awaitable[None]]]
+
+
+class AsyncMessageQueue:
+    """asyncio-native counterpart of ``MessageQueue`` for the FastAPI services.
+
+    ``connect()`` returns immediately and connects in the background with
+    exponential backoff, reconnecting the same way if the connection drops.
+    Until then ``publish`` returns ``False`` rather than making the caller
+    wait. Callbacks may be plain functions or coroutine functions, and
+    ``listen()`` offers the same subscriptions as an async iterator.
+
+    ``connect``/``close`` are reference counted so several apps in one
+    process can share an instance from their lifespans.
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 6379,
+        db: int = 0,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        codec: Union[str, Codec, None] = None,
+        trusted: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.codec = get_codec(codec)
+        self.trusted = trusted
+        self.redis_client: Optional[aioredis.Redis] = None
+        self.subscribers: Dict[str, List[Callback]] = {}
+        self.pattern_subscribers: Dict[str, List[Callback]] = {}
+
+        self._users = 0
+        self._connected = asyncio.Event()
+        self._pubsub: Optional[aioredis.client.PubSub] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    async def connect(self):
+        """Start connecting in the background; does not wait for Redis"""
+        self._users += 1
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        """Release this app's hold; the last holder stops the connection"""
+        self._users = max(self._users - 1, 0)
+        if self._users or self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        await self._disconnect()
+
+    async def publish(self, message: Message) -> bool:
+        if not self.connected:
+            logger.warning("Redis not connected, dropping message: %s", message.event_type)
+            record_published(message.event_type, False)
+            return False
+        try:
+            await self.redis_client.publish(message.event_type, encode_message(message, self.codec))
+            logger.debug("Published message: %s", message.event_type)
+            record_published(message.event_type, True)
+            return True
+        except Exception as e:
+            logger.error("Error publishing message: %s", e)
+            record_published(message.event_type, False)
+            return False
+
+    async def publish_many(self, messages: Iterable[Message]) -> List[bool]:
+        """Publish messages in one pipelined round trip; one success flag per message.
+
+        A message that fails to encode is reported as failed without
+        affecting the rest of the batch.
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        if not self.connected:
+            logger.warning("Redis not connected, dropping %d messages", len(messages))
+            return _record_batch([(message.event_type, None) for message in messages], [ConnectionError()] * len(messages))
+        encoded, errors = _encode_each(messages, lambda message: encode_message(message, self.codec))
+        flags = iter(await self._send_batch(encoded))
+        return [False if error else next(flags) for error in errors]
+
+    async def _send_batch(self, batch: List[Tuple[str, Wire]]) -> List[bool]:
+        if not batch:
+            return []
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for channel, payload in batch:
+                    pipe.publish(channel, payload)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error("Error publishing batch of %d messages: %s", len(batch), e)
+            return _record_batch(batch, [e] * len(batch))
+        return _record_batch(batch, results)
+
+    async def subscribe(self, event_type: str, callback: Callback):
+        """Register a callback for an event type or glob pattern such as ``user.*``.
+
+        Subscriptions made before the connection is up are applied once it is.
+        """
+        is_pattern = _is_pattern(event_type)
+        registry = self.pattern_subscribers if is_pattern else self.subscribers
+        callbacks = registry.setdefault(event_type, [])
+        if callback in callbacks:
+            logger.warning("Callback already subscribed to event: %s", event_type)
+            return
+        callbacks.append(callback)
+        if len(callbacks) == 1 and self._pubsub is not None:
+            try:
+                if is_pattern:
+                    await self._pubsub.psubscribe(event_type)
+                else:
+                    await self._pubsub.subscribe(event_type)
+            except Exception as e:
+                logger.error("Error subscribing to event %s: %s", event_type, e)
+        logger.info("Successfully subscribed to event: %s", event_type)
+
+    async def unsubscribe(self, event_type: str, callback: Callback):
+        """Remove a callback, unsubscribing from Redis when it was the last one"""
+        is_pattern = _is_pattern(event_type)
+        registry = self.pattern_subscribers if is_pattern else self.subscribers
+        callbacks = registry.get(event_type)
+        if not callbacks or callback not in callbacks:
+            logger.warning("Callback not found for event: %s", event_type)
+            return
+        callbacks.remove(callback)
+        if not callbacks:
+            del registry[event_type]
+            if self._pubsub is not None:
+                try:
+                    if is_pattern:
+                        await self._pubsub.punsubscribe(event_type)
+                    else:
+                        await self._pubsub.unsubscribe(event_type)
+                except Exception as e:
+                    logger.error("Error unsubscribing from event %s: %s", event_type, e)
+        logger.info("Unsubscribed from event: %s", event_type)
+
+    async def listen(self, *event_types: str, max_pending: int = 1000) -> AsyncIterator[Message]:
+        """Iterate over messages for the given event types or patterns.
+
+        At most ``max_pending`` messages are buffered; beyond that the
+        listener waits for the consumer.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        for event_type in event_types:
+            await self.subscribe(event_type, queue.put)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for event_type in event_types:
+                await self.unsubscribe(event_type, queue.put)
+
+    async def _run(self):
+        """Connect with exponential backoff, then dispatch until the connection drops"""
+        attempt = 0
+        while True:
+            try:
+                await self._connect()
+                attempt = 0
+                await self._dispatch_loop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._disconnect()
+                delay = min(self.initial_backoff * 2 ** attempt, self.max_backoff)
+                delay *= random.uniform(0.5, 1.0)
+                attempt += 1
+                logger.warning(
+                    "Redis connection attempt %s failed (%s), retrying in %.1f seconds...", attempt, e, delay
+                )
+                await asyncio.sleep(delay)
+
+    async def _connect(self):
+        client = aioredis.Redis(
+            host=self.host,
+            port=self.port,
+            db=self.db,
+            decode_responses=not self.codec.binary,
+            socket_timeout=5
+        )
+        await client.ping()
+        self.redis_client = client
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        if self.subscribers:
+            await self._pubsub.subscribe(*self.subscribers)
+        if self.pattern_subscribers:
+            await self._pubsub.psubscribe(*self.pattern_subscribers)
+        self._connected.set()
+        logger.info("Successfully connected to Redis at %s:%s", self.host, self.port)
+
+    async def _disconnect(self):
+        self._connected.clear()
+        pubsub, self._pubsub = self._pubsub, None
+        client, self.redis_client = self.redis_client, None
+        try:
+            if pubsub is not None:
+                await pubsub.aclose()
+            if client is not None:
+                await client.aclose()
+        except Exception as e:
+            logger.debug("Error closing Redis connection: %s", e)
+
+    async def _dispatch_loop(self):
+        while True:
+            if not self.subscribers and not self.pattern_subscribers:
+                # Nothing to read yet; still notice a dead connection
+                await self.redis_client.ping()
+                await asyncio.sleep(1.0)
+                continue
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None:
+                await self._dispatch(message)
+
+    async def _dispatch(self, message: dict):
+        if message["type"] == "pmessage":
+            callbacks = self.pattern_subscribers.get(_text(message["pattern"]), [])
+        elif message["type"] == "message":
+            callbacks = self.subscribers.get(_text(message["channel"]), [])
+        else:
+            return
+        if not callbacks:
+            return
+
+        try:
+            message_obj = decode_message(message["data"], trusted=self.trusted)
+        except Exception as e:
+            logger.error("Error decoding message on %s: %s", _text(message['channel']), e)
+            return
+
+        started = time.perf_counter()
+        ok = True
+        for callback_fn in list(callbacks):
+            try:
+                result = callback_fn(message_obj)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                ok = False
+                logger.error("Error processing message: %s", e)
+        record_handled(message_obj.event_type, time.perf_counter() - started, ok)
@@ -0,0 +1,205 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+from .models import MESSAGE_SCHEMA_VERSION, Message
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional binary codec
+    msgpack = None
+
+Wire = Union[str, bytes]
+
+# Frames start with "<tag><schema version>:", e.g. "J1:{...}" or b"M1:\x84...".
+# Frames without a header are legacy plain JSON from before codecs existed.
+HEADER_SEPARATOR = ":"
+MAX_HEADER_LENGTH = 8
+
+
+class Codec:
+    """Serializes the fields of a Message to and from the wire.
+
+    ``dumps`` may return str or bytes. Text codecs (``binary = False``)
+    must produce UTF-8, so their frames can be read back as str on a
+    client created with decode_responses=True; OrjsonCodec returns bytes.
+    """
+
+    name = ""
+    tag = ""
+    # Binary codecs need a Redis client created with decode_responses=False
+    binary = False
+
+    def dumps(self, data: Dict[str, Any]) -> Wire:
+        raise NotImplementedError
+
+    def loads(self, body: Wire) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = "json"
+    tag = "J"
+
+    def dumps(self, data: Dict[str, Any]) -> Wire:
+        return json.dumps(data, default=_json_default, separators=(",", ":"))
+
+    def loads(self, body: Wire) -> Dict[str, Any]:
+        return json.loads(body)
+
+
+class OrjsonCodec(JsonCodec):
+    """Same wire format as JsonCodec, encoded by orjson.
+
+    Frames are still decoded by the stdlib: orjson silently turns integers
+    wider than 64 bits into floats, where ``json.loads`` is lossless.
+    """
+
+    name = "orjson"
+
+    def dumps(self, data: Dict[str, Any]) -> Wire:
+        return orjson.dumps(data, default=_json_default)
+
+
+class MsgpackCodec(Codec):
+    """Compact binary codec; timestamps travel as native msgpack Timestamps.
+
+    Message timestamps decode as naive UTC, like ``Message``'s default.
+    Datetimes inside the payload are sent as ISO strings, as the JSON
+    codecs send them, so subscribers get the same payload whichever codec
+    the producer used.
+    """
+
+    name = "msgpack"
+    tag = "M"
+    binary = True
+
+    def dumps(self, data: Dict[str, Any]) -> Wire:
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, datetime):
+            data = {**data, "timestamp": msgpack.Timestamp.from_datetime(_as_utc(timestamp))}
+        return msgpack.packb(data, default=_json_default)
+
+    def loads(self, body: Wire) -> Dict[str, Any]:
+        data = msgpack.unpackb(body, timestamp=3)
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, datetime):
+            data["timestamp"] = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return data
+
+
+def available_codecs() -> Dict[str, Codec]:
+    codecs: Dict[str, Codec] = {"json": JsonCodec()}
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackCodec()
+    return codecs
+
+
+def get_codec(codec: Union[str, Codec, None] = None) -> Codec:
+    """Resolve a codec name ("json", "orjson", "msgpack") or instance"""
+    if isinstance(codec, Codec):
+        return codec
+    name = codec or "json"
+    codecs = available_codecs()
+    if name not in codecs:
+        raise ValueError(f"Codec {name!r} is unknown or its library is not installed")
+    return codecs[name]
+
+
+def _decoders() -> Dict[str, Codec]:
+    """Codec used to read each tag"""
+    global _DECODERS
+    if _DECODERS is None:
+        _DECODERS = {JsonCodec.tag: JsonCodec()}
+        if msgpack is not None:
+            _DECODERS[MsgpackCodec.tag] = MsgpackCodec()
+    return _DECODERS
+
+
+_DECODERS: Optional[Dict[str, Codec]] = None
+
+
+def encode_message(message: Message, codec: Codec) -> Wire:
+    """Frame a message with its codec tag and the schema version"""
+    body = codec.dumps({
+        "event_type": message.event_type,
+        "payload": message.payload,
+        "timestamp": message.timestamp,
+        "service": message.service,
+    })
+    header = f"{codec.tag}{MESSAGE_SCHEMA_VERSION}{HEADER_SEPARATOR}"
+    if isinstance(body, bytes):
+        return header.encode() + body
+    return header + body
+
+
+def decode_message(raw: Wire, trusted: bool = False) -> Message:
+    """Decode any framed (or legacy) message.
+
+    With ``trusted`` the fields are not re-validated; use it only for
+    producers that encoded a valid Message with ``encode_message``.
+    """
+    if isinstance(raw, bytes):
+        position = raw.find(b":", 0, MAX_HEADER_LENGTH)
+        header = raw[:position].decode() if raw[:1] != b"{" and position > 0 else None
+    else:
+        position = raw.find(":", 0, MAX_HEADER_LENGTH)
+        header = raw[:position] if raw[:1] != "{" and position > 0 else None
+
+    if header is None:
+        data = json.loads(raw)
+    else:
+        tag, version = header[:1], header[1:]
+        if not version.isdigit() or int(version) > MESSAGE_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported message schema version: {version}")
+        codec = _decoders().get(tag)
+        if codec is None:
+            raise ValueError(f"No codec available for message tag {tag!r}")
+        body = raw[position + 1:]
+        if codec.binary and isinstance(body, str):
+            raise ValueError("Binary message received on a text connection")
+        data = codec.loads(body)
+
+    if not trusted:
+        return Message(**data)
+    return _construct_trusted(data)
+
+
+def _construct_trusted(data: Dict[str, Any]) -> Message:
+    """Build a Message without validation (cheaper than ``model_construct``)"""
+    timestamp = data.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    message = Message.__new__(Message)
+    object.__setattr__(message, "__dict__", {
+        "event_type": data["event_type"],
+        "payload": data.get("payload") or {},
+        "timestamp": timestamp or datetime.utcnow(),
+        "service": data["service"],
+    })
+    object.__setattr__(message, "__pydantic_fields_set__", _MESSAGE_FIELDS)
+    object.__setattr__(message, "__pydantic_extra__", None)
+    object.__setattr__(message, "__pydantic_private__", None)
+    return message
+
+
+_MESSAGE_FIELDS = frozenset(("event_type", "payload", "timestamp", "service"))
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
@@ -0,0 +1,296 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from ..common.metrics import CallbackGauge
+from .instrumentation import DISPATCH_BACKPRESSURE, DISPATCH_DROPPED, record_handled
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_MODES = ("inline", "thread", "process", "asyncio")
+ORDERINGS = ("none", "key")
+
+
+def invoke_callbacks(callbacks: List[Callable], message: Message) -> bool:
+    """Run every callback for a message; returns False if any of them raised.
+
+    Module level so it can be shipped to a process pool.
+    """
+    ok = True
+    for callback_fn in callbacks:
+        try:
+            callback_fn(message)
+        except Exception as e:
+            ok = False
+            logger.error("Error processing message: %s", e)
+    return ok
+
+
+async def invoke_callbacks_async(callbacks: List[Callable], message: Message) -> bool:
+    ok = True
+    for callback_fn in callbacks:
+        try:
+            result = callback_fn(message)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            ok = False
+            logger.error("Error processing message: %s", e)
+    return ok
+
+
+class HandlerStats:
+    """Latency and outcome counters for one event type"""
+
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        self.completed += 1
+        if not ok:
+            self.failed += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class Dispatcher:
+    """Runs subscriber callbacks off the listener thread.
+
+    ``mode`` picks where callbacks run: ``inline`` on the listener thread,
+    ``thread`` or ``process`` in a pool of ``max_workers``, or ``asyncio`` as
+    tasks on ``loop`` (coroutine callbacks are awaited). At most
+    ``max_in_flight`` messages are queued or running; when full, ``submit``
+    blocks the listener (``overflow="block"``) or drops the message
+    (``overflow="drop"``). ``per_event_limit`` caps concurrent messages per
+    event type. With ``ordering="key"`` messages sharing ``key_func(message)``
+    run one at a time, in arrival order.
+
+    In ``process`` mode each callback runs on a pickled copy in a child
+    process, so whatever it changes in memory (a cache it evicts, a list it
+    appends to, counters on its instance) is lost; only its return value
+    and exceptions come back. Use it for module-level functions whose
+    effects are external, e.g. writes to a database or another service.
+    ``check_callback`` refuses bound methods, the usual way of subscribing
+    an object's state, in that mode.
+    """
+
+    def __init__(
+        self,
+        mode: str = "inline",
+        max_workers: Optional[int] = None,
+        max_in_flight: int = 1000,
+        per_event_limit: Optional[int] = None,
+        ordering: str = "none",
+        key_func: Optional[Callable[[Message], Hashable]] = None,
+        overflow: str = "block",
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        if mode not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode: {mode}")
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown ordering: {ordering}")
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if mode == "asyncio" and loop is None:
+            raise ValueError("The asyncio dispatch mode needs an event loop")
+
+        self.mode = mode
+        self.max_in_flight = max_in_flight
+        self.per_event_limit = per_event_limit
+        self.ordering = ordering
+        self.key_func = key_func or (lambda message: message.event_type)
+        self.overflow = overflow
+        self.loop = loop
+
+        workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mq-dispatch")
+        elif mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._event_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        # Per-key FIFO of work waiting behind a running message
+        self._key_queues: Dict[Hashable, Deque[Tuple]] = {}
+
+        # Counters
+        self.in_flight = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.handlers: Dict[str, HandlerStats] = {}
+        _dispatchers.append(self)
+
+    def check_callback(self, callback: Callable):
+        """Raise ValueError for a callback whose effects this mode would lose"""
+        owner = getattr(callback, "__self__", None)
+        if self.mode == "process" and owner is not None and not inspect.ismodule(owner):
+            raise ValueError(
+                f"{callback.__qualname__} is a bound method; in process mode it would run on a copy "
+                "of its object in another process and its changes would be lost"
+            )
+
+    def submit(self, event_type: str, callbacks: List[Callable], message: Message) -> Optional[Future]:
+        """Queue a message for its callbacks.
+
+        Returns a future resolving to True when every callback succeeded, or
+        None if the message was dropped.
+        """
+        if self.mode == "inline":
+            started = time.perf_counter()
+            ok = invoke_callbacks(list(callbacks), message)
+            self._record(event_type, time.perf_counter() - started, ok)
+            future: Future = Future()
+            future.set_result(ok)
+            return future
+
+        if not self._acquire(self._slots, event_type):
+            return None
+        event_slot = None
+        if self.per_event_limit:
+            with self._lock:
+                event_slot = self._event_slots.setdefault(
+                    event_type, threading.BoundedSemaphore(self.per_event_limit)
+                )
+            if not self._acquire(event_slot, event_type):
+                self._slots.release()
+                return None
+
+        with self._lock:
+            self.in_flight += 1
+
+        result: Future = Future()
+        work = (event_type, list(callbacks), message, event_slot, result)
+        if self.ordering == "key":
+            key = self.key_func(message)
+            with self._lock:
+                queue = self._key_queues.get(key)
+                if queue is not None:
+                    # Another message with this key is running; wait behind it
+                    queue.append(work)
+                    return result
+                self._key_queues[key] = deque()
+            self._start(work, key)
+        else:
+            self._start(work, None)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = sum(len(queue) for queue in self._key_queues.values())
+            return {
+                "mode": self.mode,
+                "ordering": self.ordering,
+                "in_flight": self.in_flight,
+                "waiting_on_key": waiting,
+                "max_in_flight": self.max_in_flight,
+                "dropped": self.dropped,
+                "backpressure_waits": self.backpressure_waits,
+                "handlers": {event_type: stats.as_dict() for event_type, stats in self.handlers.items()},
+            }
+
+    def close(self, wait: bool = True):
+        if self in _dispatchers:
+            _dispatchers.remove(self)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _acquire(self, semaphore: threading.BoundedSemaphore, event_type: str) -> bool:
+        if semaphore.acquire(blocking=False):
+            return True
+        if self.overflow == "drop":
+            with self._lock:
+                self.dropped += 1
+            DISPATCH_DROPPED.inc(event_type)
+            return False
+        with self._lock:
+            self.backpressure_waits += 1
+        DISPATCH_BACKPRESSURE.inc(event_type)
+        semaphore.acquire()
+        return True
+
+    def _start(self, work: Tuple, key: Optional[Hashable]):
+        event_type, callbacks, message, _, _ = work
+        started = time.perf_counter()
+        try:
+            if self.mode == "asyncio":
+                future = asyncio.run_coroutine_threadsafe(invoke_callbacks_async(callbacks, message), self.loop)
+            else:
+                future = self._executor.submit(invoke_callbacks, callbacks, message)
+        except Exception as e:
+            logger.error("Error dispatching message %s: %s", event_type, e)
+            future = Future()
+            future.set_result(False)
+        future.add_done_callback(lambda done: self._finish(work, key, started, done))
+
+    def _finish(self, work: Tuple, key: Optional[Hashable], started: float, done: Future):
+        event_type, _, _, event_slot, result = work
+        try:
+            ok = bool(done.result())
+        except Exception as e:
+            logger.error("Error processing message %s: %s", event_type, e)
+            ok = False
+        self._record(event_type, time.perf_counter() - started, ok)
+
+        with self._lock:
+            self.in_flight -= 1
+        if event_slot is not None:
+            event_slot.release()
+        self._slots.release()
+        result.set_result(ok)
+
+        if key is not None:
+            with self._lock:
+                queue = self._key_queues[key]
+                if not queue:
+                    del self._key_queues[key]
+                    return
+                next_work = queue.popleft()
+            self._start(next_work, key)
+
+    def _record(self, event_type: str, seconds: float, ok: bool):
+        with self._lock:
+            stats = self.handlers.get(event_type)
+            if stats is None:
+                stats = self.handlers[event_type] = HandlerStats()
+            stats.record(seconds, ok)
+        record_handled(event_type, seconds, ok)
+
+
+_dispatchers: List[Dispatcher] = []
+
+
+def _dispatch_samples(field: str):
+    totals: Dict[str, int] = {}
+    for dispatcher in list(_dispatchers):
+        totals[dispatcher.mode] = totals.get(dispatcher.mode, 0) + dispatcher.stats()[field]
+    return [((mode,), total) for mode, total in totals.items()]
+
+
+DISPATCH_IN_FLIGHT = CallbackGauge(
+    "mq_dispatch_in_flight", "Messages queued or running in a dispatcher",
+    lambda: _dispatch_samples("in_flight"), ["mode"],
+)
+DISPATCH_WAITING_ON_KEY = CallbackGauge(
+    "mq_dispatch_waiting_on_key", "Messages waiting behind another with the same ordering key",
+    lambda: _dispatch_samples("waiting_on_key"), ["mode"],
+)
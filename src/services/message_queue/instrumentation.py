@@ -0,0 +1,34 @@
+from ..common.metrics import Counter, Histogram
+
+MESSAGES_PUBLISHED = Counter(
+    "mq_messages_published_total", "Messages handed to Redis, by outcome", ["event_type", "outcome"]
+)
+MESSAGES_CONSUMED = Counter(
+    "mq_messages_consumed_total", "Messages delivered to subscriber callbacks, by outcome", ["event_type", "outcome"]
+)
+HANDLER_SECONDS = Histogram(
+    "mq_handler_duration_seconds", "Time to run every callback for one message", ["event_type"]
+)
+DISPATCH_DROPPED = Counter(
+    "mq_dispatch_dropped_total", "Messages dropped because the dispatcher was full", ["event_type"]
+)
+DISPATCH_BACKPRESSURE = Counter(
+    "mq_dispatch_backpressure_waits_total", "Times the listener waited for a free dispatcher slot", ["event_type"]
+)
+STREAM_ENTRIES = Counter(
+    "mq_stream_entries_total", "Stream entries by outcome (acked, failed, reclaimed, dead_lettered)",
+    ["event_type", "outcome"]
+)
+
+
+def record_published(event_type: str, ok: bool):
+    MESSAGES_PUBLISHED.inc(event_type, "ok" if ok else "error")
+
+
+def record_handled(event_type: str, seconds: float, ok: bool):
+    HANDLER_SECONDS.observe(seconds, event_type)
+    MESSAGES_CONSUMED.inc(event_type, "ok" if ok else "error")
+
+
+def record_stream(event_type: str, outcome: str, count: int = 1):
+    STREAM_ENTRIES.inc(event_type, outcome, amount=count)
@@ -2,6 +2,9 @@ from pydantic import BaseModel, Field
 from typing import Dict, Any
 from datetime import datetime
 
+# Bumped whenever Message fields change incompatibly; carried in every wire frame
+MESSAGE_SCHEMA_VERSION = 1
+
 class Message(BaseModel):
     event_type: str = Field(..., description="Type of the event being published")
     payload: Dict[str, Any] = Field(default_factory=dict, description="Event payload data")
@@ -1,22 +1,68 @@
 import redis
-import json
-from datetime import datetime
-from typing import Callable, Dict, List
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 import logging
+import queue
+import threading
 import time
+from .codecs import Codec, Wire, decode_message, encode_message, get_codec
+from .dispatch import Dispatcher, invoke_callbacks
+from .instrumentation import record_handled, record_published
 from .models import Message
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds the listener blocks reading before it runs queued (un)subscribe calls
+LISTEN_POLL_INTERVAL = 0.1
+
 class MessageQueue:
-    def __init__(self, host: str = "0.0.0.0", port: int = 6379, db: int = 0, max_retries: int = 3):
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 6379,
+        db: int = 0,
+        max_retries: int = 3,
+        batch_size: int = 0,
+        batch_interval: float = 0.005,
+        dispatcher: Optional[Dispatcher] = None,
+        codec: Union[str, Codec, None] = None,
+        trusted: bool = False
+    ):
         self.host = host
         self.port = port
         self.db = db
         self.max_retries = max_retries
+        # Wire codec for outgoing messages; incoming frames name their own codec.
+        # trusted skips re-validating messages from our own producers.
+        self.codec = get_codec(codec)
+        self.trusted = trusted
         self.redis_client = self._connect_with_retry()
         self.subscribers: Dict[str, List[Callable]] = {}
+        self.pattern_subscribers: Dict[str, List[Callable]] = {}
+
+        # One pubsub connection and listener thread multiplex every subscription.
+        # PubSub is not thread-safe, so once the listener runs it owns the
+        # PubSub and other threads queue their calls for it
+        self._pubsub: Optional[redis.client.PubSub] = None
+        self._pubsub_calls: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: Optional[threading.Thread] = None
+        self._listening = False
+        self._subscriptions_lock = threading.Lock()
+
+        # Where callbacks run; None runs them inline on the listener thread
+        self.dispatcher = dispatcher
+
+        # Auto-batching: enqueue() buffers messages and a flusher thread sends
+        # them in one pipeline every batch_interval seconds or batch_size messages
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._buffer: List[Tuple[str, Wire, Future]] = []
+        self._buffer_ready = threading.Condition()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        if batch_size > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
 
     def _connect_with_retry(self) -> redis.Redis:
         retries = 0
@@ -26,65 +72,310 @@ class MessageQueue:
                     host=self.host,
                     port=self.port,
                     db=self.db,
-                    decode_responses=True,
+                    decode_responses=not self.codec.binary,
                     socket_timeout=5
                 )
                 # Test the connection
                 client.ping()
-                logger.info(f"Successfully connected to Redis at {self.host}:{self.port}")
+                logger.info("Successfully connected to Redis at %s:%s", self.host, self.port)
                 return client
             except redis.ConnectionError as e:
                 retries += 1
                 if retries == self.max_retries:
-                    logger.error(f"Failed to connect to Redis after {self.max_retries} attempts: {str(e)}")
+                    logger.error("Failed to connect to Redis after %s attempts: %s", self.max_retries, e)
                     raise
-                logger.warning(f"Redis connection attempt {retries} failed, retrying in 2 seconds...")
+                logger.warning("Redis connection attempt %s failed, retrying in 2 seconds...", retries)
                 time.sleep(2)
         raise redis.ConnectionError("Failed to connect to Redis")
 
+    def _encode(self, message: Message) -> Wire:
+        return encode_message(message, self.codec)
+
+    def _decode(self, data: Wire) -> Message:
+        return decode_message(data, trusted=self.trusted)
+
     def publish(self, message: Message) -> bool:
         try:
-            message_dict = message.model_dump()
-            message_json = json.dumps(message_dict, default=str)
-            self.redis_client.publish(message.event_type, message_json)
-            logger.info(f"Published message: {message.event_type}")
+            self.redis_client.publish(message.event_type, self._encode(message))
+            logger.debug("Published message: %s", message.event_type)
+            record_published(message.event_type, True)
             return True
         except Exception as e:
-            logger.error(f"Error publishing message: {str(e)}")
+            logger.error("Error publishing message: %s", e)
+            record_published(message.event_type, False)
             return False
 
+    def publish_many(self, messages: Iterable[Message]) -> List[bool]:
+        """Publish messages in a single pipelined round trip.
+
+        Returns one success flag per message, in order; a message that
+        fails to encode is reported as failed without affecting the rest.
+        """
+        encoded, errors = _encode_each(messages, self._encode)
+        flags = iter(self._send_batch(encoded))
+        return [False if error else next(flags) for error in errors]
+
+    def _send_batch(self, batch: List[Tuple[str, Wire]]) -> List[bool]:
+        if not batch:
+            return []
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel, payload in batch:
+                pipe.publish(channel, payload)
+            results = pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error("Error publishing batch of %s messages: %s", len(batch), e)
+            return _record_batch(batch, [e] * len(batch))
+
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if failed:
+            logger.error("%s of %s messages in batch failed to publish", failed, len(batch))
+        logger.debug("Published batch of %d messages", len(batch))
+        return _record_batch(batch, results)
+
+    def enqueue(self, message: Message) -> Future:
+        """Buffer a message for the next auto-batched flush.
+
+        The returned future resolves to the message's success flag. Without
+        auto-batching the message is published immediately.
+        """
+        future: Future = Future()
+        if self._flusher is None or self._closed:
+            future.set_result(self.publish(message))
+            return future
+
+        encoded, errors = _encode_each([message], self._encode)
+        if errors[0]:
+            future.set_result(False)
+            return future
+
+        with self._buffer_ready:
+            self._buffer.append((*encoded[0], future))
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._buffer_ready.notify()
+        return future
+
+    def flush(self):
+        """Send everything buffered by enqueue() right away"""
+        with self._buffer_ready:
+            pending, self._buffer = self._buffer, []
+        self._flush_pending(pending)
+
+    def close(self):
+        """Send anything still buffered, then stop the flusher and listener threads"""
+        with self._buffer_ready:
+            self._closed = True
+            self._buffer_ready.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+        self._listening = False
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+        self._run_pubsub_calls()
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+
+    def _flush_pending(self, pending: List[Tuple[str, Wire, Future]]):
+        if not pending:
+            return
+        results = self._send_batch([(channel, payload) for channel, payload, _ in pending])
+        for (_, _, future), ok in zip(pending, results):
+            future.set_result(ok)
+
+    def _flush_loop(self):
+        while True:
+            with self._buffer_ready:
+                while not self._buffer and not self._closed:
+                    self._buffer_ready.wait()
+                if self._closed:
+                    return
+                # Give the batch a few milliseconds to fill up
+                deadline = time.monotonic() + self.batch_interval
+                while len(self._buffer) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._buffer_ready.wait(remaining)
+                pending, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            self._flush_pending(pending)
+
     def subscribe(self, event_type: str, callback: Callable[[Message], None]):
-        if event_type not in self.subscribers:
-            self.subscribers[event_type] = []
-        self.subscribers[event_type].append(callback)
+        """Register a callback for an event type or a glob pattern such as ``user.*``.
+
+        All subscriptions share one pubsub connection and one listener thread.
+        Registering the same callback twice for an event type has no effect.
+        Raises ValueError for a callback the dispatcher cannot run faithfully.
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.check_callback(callback)
+        is_pattern = _is_pattern(event_type)
+        registry = self.pattern_subscribers if is_pattern else self.subscribers
 
         try:
-            pubsub = self.redis_client.pubsub()
-            pubsub.subscribe(event_type)
-
-            def message_handler():
-                for message in pubsub.listen():
-                    if message["type"] == "message":
-                        try:
-                            message_data = json.loads(message["data"])
-                            message_obj = Message(**message_data)
-                            for callback_fn in self.subscribers[event_type]:
-                                callback_fn(message_obj)
-                        except Exception as e:
-                            logger.error(f"Error processing message: {str(e)}")
-
-            # Start listening in a separate thread
-            import threading
-            thread = threading.Thread(target=message_handler, daemon=True)
-            thread.start()
-            logger.info(f"Successfully subscribed to event: {event_type}")
+            pending = None
+            with self._subscriptions_lock:
+                callbacks = registry.setdefault(event_type, [])
+                if callback in callbacks:
+                    logger.warning("Callback already subscribed to event: %s", event_type)
+                    return
+                callbacks.append(callback)
+                if len(callbacks) == 1:
+                    if self._pubsub is None:
+                        self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                    if is_pattern:
+                        pending = self._pubsub_call(lambda pubsub: pubsub.psubscribe(event_type))
+                    else:
+                        pending = self._pubsub_call(lambda pubsub: pubsub.subscribe(event_type))
+                if self._listener is None:
+                    self._listening = True
+                    self._listener = threading.Thread(target=self._listen, daemon=True)
+                    self._listener.start()
+            # Waited for outside the lock, which the listener takes to dispatch
+            if pending is not None:
+                pending.result()
+            logger.info("Successfully subscribed to event: %s", event_type)
         except Exception as e:
-            logger.error(f"Error subscribing to event {event_type}: {str(e)}")
+            logger.error("Error subscribing to event %s: %s", event_type, e)
 
     def unsubscribe(self, event_type: str, callback: Callable[[Message], None]):
-        if event_type in self.subscribers:
+        """Remove a callback, unsubscribing from Redis when it was the last one"""
+        is_pattern = _is_pattern(event_type)
+        registry = self.pattern_subscribers if is_pattern else self.subscribers
+
+        pending = None
+        with self._subscriptions_lock:
+            callbacks = registry.get(event_type)
+            if not callbacks or callback not in callbacks:
+                logger.warning("Callback not found for event: %s", event_type)
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del registry[event_type]
+                if is_pattern:
+                    pending = self._pubsub_call(lambda pubsub: pubsub.punsubscribe(event_type))
+                else:
+                    pending = self._pubsub_call(lambda pubsub: pubsub.unsubscribe(event_type))
+        if pending is not None:
+            try:
+                pending.result()
+            except Exception as e:
+                logger.error("Error unsubscribing from event %s: %s", event_type, e)
+        logger.info("Unsubscribed from event: %s", event_type)
+
+    def _pubsub_call(self, fn: Callable[[redis.client.PubSub], Any]) -> Future:
+        """Run ``fn(pubsub)`` on the listener thread, or right away if none runs.
+
+        Called with the subscriptions lock held, so calls run in the order
+        the registry changed.
+        """
+        future: Future = Future()
+        if self._listener is None:
+            _run_call(fn, self._pubsub, future)
+        else:
+            self._pubsub_calls.put((fn, future))
+        return future
+
+    def _run_pubsub_calls(self):
+        while True:
             try:
-                self.subscribers[event_type].remove(callback)
-                logger.info(f"Unsubscribed from event: {event_type}")
-            except ValueError:
-                logger.warning(f"Callback not found for event: {event_type}")
\ No newline at end of file
+                fn, future = self._pubsub_calls.get_nowait()
+            except queue.Empty:
+                return
+            _run_call(fn, self._pubsub, future)
+
+    def _listen(self):
+        """Listener thread: read every subscribed channel and dispatch"""
+        while self._listening:
+            self._run_pubsub_calls()
+            try:
+                message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_POLL_INTERVAL)
+            except Exception as e:
+                if not self._listening:
+                    break
+                logger.error("Error reading from pubsub: %s", e)
+                time.sleep(1)
+                continue
+            if message is not None:
+                self._dispatch(message)
+        self._run_pubsub_calls()
+
+    def _dispatch(self, message: dict):
+        # A copy taken under the lock, so (un)subscribing meanwhile cannot
+        # change the list a running dispatch iterates
+        with self._subscriptions_lock:
+            if message["type"] == "pmessage":
+                callbacks = list(self.pattern_subscribers.get(_text(message["pattern"]), ()))
+            elif message["type"] == "message":
+                callbacks = list(self.subscribers.get(_text(message["channel"]), ()))
+            else:
+                return
+        if not callbacks:
+            return
+
+        try:
+            message_obj = self._decode(message["data"])
+        except Exception as e:
+            logger.error("Error decoding message on %s: %s", _text(message['channel']), e)
+            return
+
+        if self.dispatcher is None:
+            self._run_callbacks(callbacks, message_obj)
+        else:
+            self.dispatcher.submit(message_obj.event_type, callbacks, message_obj)
+
+    def _run_callbacks(self, callbacks: List[Callable], message_obj: Message) -> bool:
+        """Invoke every callback inline; returns False if any of them raised"""
+        started = time.perf_counter()
+        ok = invoke_callbacks(list(callbacks), message_obj)
+        record_handled(message_obj.event_type, time.perf_counter() - started, ok)
+        return ok
+
+
+def _encode_each(messages: Iterable[Message], encode: Callable[[Message], Wire]) -> Tuple[List[Tuple[str, Wire]], List[Optional[Exception]]]:
+    """Encode messages one by one for a batch.
+
+    Returns the encoded ``(event_type, wire)`` pairs and, per input
+    message, the error that stopped it from encoding (or None). Failures
+    are logged and counted as failed publishes.
+    """
+    encoded, errors = [], []
+    for message in messages:
+        try:
+            encoded.append((message.event_type, encode(message)))
+            errors.append(None)
+        except Exception as e:
+            logger.error("Error encoding %s message: %s", message.event_type, e)
+            record_published(message.event_type, False)
+            errors.append(e)
+    return encoded, errors
+
+
+def _run_call(fn: Callable[[redis.client.PubSub], Any], pubsub: redis.client.PubSub, future: Future):
+    try:
+        future.set_result(fn(pubsub))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _record_batch(batch: List[Tuple[str, Wire]], results: List) -> List[bool]:
+    """Count a pipelined batch's outcomes and return its success flags"""
+    flags = [not isinstance(result, Exception) for result in results]
+    for (event_type, _), ok in zip(batch, flags):
+        record_published(event_type, ok)
+    return flags
+
+
+def _is_pattern(event_type: str) -> bool:
+    return any(char in event_type for char in "*?[")
+
+
+def _text(value: Union[str, bytes]) -> str:
+    """Channel names arrive as bytes on clients used by binary codecs"""
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,284 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from .models import Message
+from .codecs import Wire
+from .instrumentation import record_published, record_stream
+from .queue_service import MessageQueue, _is_pattern, _record_batch, _text
+
+logger = logging.getLogger(__name__)
+
+
+class StreamMessageQueue(MessageQueue):
+    """Durable MessageQueue backed by Redis Streams and consumer groups.
+
+    Each event type maps to the stream ``<stream_prefix><event_type>``,
+    trimmed to roughly ``maxlen`` entries. Consumers sharing a ``group`` split
+    the stream between them, so replicas scale horizontally without
+    processing a message twice. A message is acknowledged only when every
+    callback succeeds; unacknowledged entries idle for ``claim_idle_ms`` are
+    reclaimed and retried, and after ``max_deliveries`` attempts they are
+    moved to ``<stream>:dead``.
+    """
+
+    def __init__(
+        self,
+        group: str,
+        consumer: Optional[str] = None,
+        maxlen: int = 100_000,
+        read_count: int = 100,
+        block_ms: int = 1000,
+        claim_idle_ms: int = 60_000,
+        max_deliveries: int = 5,
+        stream_prefix: str = "events:",
+        **kwargs
+    ):
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.maxlen = maxlen
+        self.read_count = read_count
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.stream_prefix = stream_prefix
+        self._last_claim = 0.0
+        super().__init__(**kwargs)
+
+        # Counters
+        self.acked = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self.dead_lettered = 0
+
+    def stream_key(self, event_type: str) -> str:
+        return f"{self.stream_prefix}{event_type}"
+
+    def dead_letter_key(self, event_type: str) -> str:
+        return f"{self.stream_key(event_type)}:dead"
+
+    def publish(self, message: Message) -> bool:
+        try:
+            self.redis_client.xadd(
+                self.stream_key(message.event_type),
+                {"data": self._encode(message)},
+                maxlen=self.maxlen,
+                approximate=True
+            )
+            logger.debug("Appended message: %s", message.event_type)
+            record_published(message.event_type, True)
+            return True
+        except Exception as e:
+            logger.error("Error publishing message: %s", e)
+            record_published(message.event_type, False)
+            return False
+
+    def _send_batch(self, batch: List[Tuple[str, Wire]]) -> List[bool]:
+        if not batch:
+            return []
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for event_type, payload in batch:
+                pipe.xadd(self.stream_key(event_type), {"data": payload}, maxlen=self.maxlen, approximate=True)
+            results = pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error("Error appending batch of %s messages: %s", len(batch), e)
+            return _record_batch(batch, [e] * len(batch))
+        return _record_batch(batch, results)
+
+    def subscribe(self, event_type: str, callback: Callable[[Message], None]):
+        """Register a callback and join the consumer group for the event's stream"""
+        if _is_pattern(event_type):
+            raise ValueError("Pattern subscriptions are not supported by the streams backend")
+        if self.dispatcher is not None:
+            self.dispatcher.check_callback(callback)
+
+        try:
+            with self._subscriptions_lock:
+                callbacks = self.subscribers.setdefault(event_type, [])
+                if callback in callbacks:
+                    logger.warning("Callback already subscribed to event: %s", event_type)
+                    return
+                callbacks.append(callback)
+                if len(callbacks) == 1:
+                    self._ensure_group(self.stream_key(event_type))
+                if self._listener is None:
+                    self._listening = True
+                    self._listener = threading.Thread(target=self._listen, daemon=True)
+                    self._listener.start()
+            logger.info(
+                "Successfully subscribed to stream %s as %s/%s", self.stream_key(event_type), self.group, self.consumer
+            )
+        except Exception as e:
+            logger.error("Error subscribing to event %s: %s", event_type, e)
+
+    def unsubscribe(self, event_type: str, callback: Callable[[Message], None]):
+        """Remove a callback; the stream stops being read once none remain.
+
+        The consumer group is left in place so pending work is not lost.
+        """
+        with self._subscriptions_lock:
+            callbacks = self.subscribers.get(event_type)
+            if not callbacks or callback not in callbacks:
+                logger.warning("Callback not found for event: %s", event_type)
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.subscribers[event_type]
+        logger.info("Unsubscribed from event: %s", event_type)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "acked": self.acked,
+            "failed": self.failed,
+            "reclaimed": self.reclaimed,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    def _ensure_group(self, stream: str):
+        try:
+            self.redis_client.xgroup_create(stream, self.group, id="$", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _listen(self):
+        """Consumer thread: batched XREADGROUP plus periodic reclaiming"""
+        while self._listening:
+            event_types = list(self.subscribers)
+            if not event_types:
+                time.sleep(self.block_ms / 1000)
+                continue
+
+            try:
+                if time.monotonic() - self._last_claim >= self.claim_idle_ms / 1000:
+                    self._last_claim = time.monotonic()
+                    for event_type in event_types:
+                        self._reclaim(event_type)
+
+                response = self.redis_client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {self.stream_key(event_type): ">" for event_type in event_types},
+                    count=self.read_count,
+                    block=self.block_ms
+                )
+            except Exception as e:
+                if not self._listening:
+                    return
+                logger.error("Error reading from streams: %s", e)
+                time.sleep(1)
+                continue
+
+            try:
+                for stream, entries in response or []:
+                    event_type = _text(stream)[len(self.stream_prefix):]
+                    self._process(event_type, entries)
+            except Exception as e:
+                # Unacknowledged entries stay pending and are reclaimed later
+                logger.error("Error processing stream entries: %s", e)
+                time.sleep(1)
+
+    def _process(self, event_type: str, entries: List[Tuple[str, Dict[str, str]]]):
+        callbacks = list(self.subscribers.get(event_type, []))
+        if not callbacks:
+            # Unsubscribed since the read; leave the entries pending for a later consumer
+            return
+        outcomes = []
+        for entry_id, fields in entries:
+            try:
+                message_obj = self._decode(fields.get("data", fields.get(b"data")))
+            except Exception as e:
+                # Undecodable entries can never succeed; park them right away
+                logger.error("Error decoding entry %s on %s: %s", entry_id, event_type, e)
+                self._dead_letter(event_type, entry_id, fields, self.max_deliveries, str(e))
+                continue
+            if self.dispatcher is None:
+                outcomes.append((entry_id, self._run_callbacks(callbacks, message_obj)))
+            else:
+                outcomes.append((entry_id, self.dispatcher.submit(event_type, callbacks, message_obj)))
+
+        # With a dispatcher the batch runs concurrently; ack once it settles.
+        # Dropped entries stay pending and are reclaimed later.
+        acks = []
+        for entry_id, outcome in outcomes:
+            ok = outcome.result() if isinstance(outcome, Future) else outcome
+            if ok:
+                acks.append(entry_id)
+            else:
+                self.failed += 1
+                record_stream(event_type, "failed")
+
+        if acks:
+            self.redis_client.xack(self.stream_key(event_type), self.group, *acks)
+            self.acked += len(acks)
+            record_stream(event_type, "acked", len(acks))
+
+    def _reclaim(self, event_type: str):
+        """Retry entries stuck in the group's pending list, dead-lettering repeat failures"""
+        stream = self.stream_key(event_type)
+        pending = self.redis_client.xpending_range(
+            stream, self.group, min="-", max="+", count=self.read_count, idle=self.claim_idle_ms
+        )
+        if not pending:
+            return
+
+        retry = []
+        missing = []
+        for entry in pending:
+            if entry["times_delivered"] >= self.max_deliveries:
+                entries = self.redis_client.xrange(stream, entry["message_id"], entry["message_id"])
+                if not entries:
+                    missing.append(entry["message_id"])
+                for entry_id, fields in entries:
+                    self._dead_letter(event_type, entry_id, fields, entry["times_delivered"], "max deliveries exceeded")
+            else:
+                retry.append(entry["message_id"])
+
+        if retry:
+            claimed = self.redis_client.xclaim(stream, self.group, self.consumer, self.claim_idle_ms, retry)
+            claimed = [(entry_id, fields) for entry_id, fields in claimed if entry_id is not None and fields]
+            # Ids not handed back were either trimmed or claimed by another consumer
+            returned = {_text(entry_id) for entry_id, _ in claimed}
+            unclaimed = [entry_id for entry_id in retry if _text(entry_id) not in returned]
+            missing.extend(self._missing(stream, unclaimed))
+            self.reclaimed += len(claimed)
+            record_stream(event_type, "reclaimed", len(claimed))
+            self._process(event_type, claimed)
+
+        if missing:
+            # The data was trimmed away (MAXLEN); nothing is left to retry or dead-letter
+            self.redis_client.xack(stream, self.group, *missing)
+            logger.warning("Acknowledged %s pending entries on %s whose data was trimmed", len(missing), stream)
+
+    def _missing(self, stream: str, entry_ids: List[str]) -> List[str]:
+        """The ids among ``entry_ids`` that no longer exist in ``stream``"""
+        if not entry_ids:
+            return []
+        pipe = self.redis_client.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.xrange(stream, entry_id, entry_id)
+        return [entry_id for entry_id, entries in zip(entry_ids, pipe.execute()) if not entries]
+
+    def _dead_letter(self, event_type: str, entry_id: str, fields: Dict[str, str], deliveries: int, error: str):
+        stream = self.stream_key(event_type)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.xadd(
+            self.dead_letter_key(event_type),
+            {**fields, "original_id": entry_id, "deliveries": deliveries, "error": error},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+        pipe.xack(stream, self.group, entry_id)
+        pipe.execute()
+        self.dead_lettered += 1
+        record_stream(event_type, "dead_lettered")
+        logger.warning(
+            "Moved entry %s from %s to the dead-letter stream after %s deliveries", entry_id, stream, deliveries
+        )
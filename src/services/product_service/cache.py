@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as aioredis
+from fastapi.encoders import jsonable_encoder
+
+from ..common.cache import LRUCache
+from ..common.metrics import Counter
+from ..message_queue.async_queue import AsyncMessageQueue
+from ..message_queue.models import Message
+
+logger = logging.getLogger(__name__)
+
+# Event published whenever products are written, so every replica evicts
+PRODUCT_CHANGED = "product.changed"
+
+REDIS_KEY_PREFIX = "product-cache:"
+
+# Unpublished changed ids kept for the retry; past this replicas drop everything
+MAX_UNPUBLISHED_IDS = 10000
+
+INVALIDATIONS_DEFERRED = Counter(
+    "product_cache_invalidations_deferred_total",
+    "product.changed events that could not be published and wait for the event bus"
+)
+
+
+class ProductCache:
+    """Read-through cache for product reads.
+
+    Single products live in a local LRU/TTL cache, optionally backed by a
+    shared Redis tier (``PRODUCT_CACHE_REDIS_URL``) and are stored already
+    passed through ``jsonable_encoder`` so both tiers return identical
+    JSON-ready data. List pages are cached locally only, exactly as the
+    loader returns them (encoded JSON bodies).
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        redis_url: Optional[str] = None,
+    ):
+        max_entries = max_entries or int(os.environ.get("PRODUCT_CACHE_SIZE", "10000"))
+        self.ttl = ttl or float(os.environ.get("PRODUCT_CACHE_TTL", "60"))
+        self.items = LRUCache(max_entries=max_entries, ttl=self.ttl)
+        self.pages = LRUCache(max_entries=max(max_entries // 10, 100), ttl=self.ttl)
+
+        redis_url = redis_url or os.environ.get("PRODUCT_CACHE_REDIS_URL")
+        self.redis: Optional[aioredis.Redis] = (
+            aioredis.from_url(redis_url, socket_timeout=0.5) if redis_url else None
+        )
+        self.queue: Optional[AsyncMessageQueue] = None
+
+        # Bumped on every invalidation so loads that raced a write are not cached
+        self.generation = 0
+
+        # Changes other replicas have not been told about; None when too many to list
+        self._unpublished: Optional[Set[int]] = set()
+        self._unpublished_any = False
+        self._retry: Optional[asyncio.Task] = None
+
+        # Shared tier counters
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+        self.deferred_invalidations = 0
+
+    async def get_product(
+        self,
+        product_id: int,
+        loader: Callable[[int], Awaitable[Optional[Dict[str, Any]]]],
+    ) -> Optional[Dict[str, Any]]:
+        """Return a product from the cache, loading and caching it on a miss"""
+        key = f"product:{product_id}"
+        value = self.items.get(key)
+        if value is not None:
+            return value
+
+        generation = self.generation
+        if self.redis is not None:
+            value = await self._redis_get(key)
+            if value is not None:
+                if generation == self.generation:
+                    self.items.set(key, value)
+                return value
+
+        value = await loader(product_id)
+        if value is None:
+            return None
+        value = jsonable_encoder(value)
+        if generation == self.generation:
+            self.items.set(key, value)
+            if self.redis is not None:
+                await self._redis_set(key, value)
+        return value
+
+    async def get_products(
+        self,
+        product_ids: List[int],
+        loader: Callable[[List[int]], Awaitable[Dict[int, Dict[str, Any]]]],
+    ) -> Dict[int, Dict[str, Any]]:
+        """Return the products among ``product_ids`` that exist, keyed by id.
+
+        Local hits are served first, then one Redis MGET, and every
+        remaining miss is loaded with a single ``loader`` call.
+        """
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for product_id in product_ids:
+            value = self.items.get(f"product:{product_id}")
+            if value is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = value
+        if not missing:
+            return found
+
+        generation = self.generation
+        if self.redis is not None:
+            values = await self._redis_get_many([f"product:{i}" for i in missing])
+            still_missing = []
+            for product_id, value in zip(missing, values):
+                if value is None:
+                    still_missing.append(product_id)
+                    continue
+                found[product_id] = value
+                if generation == self.generation:
+                    self.items.set(f"product:{product_id}", value)
+            missing = still_missing
+            if not missing:
+                return found
+
+        loaded = {product_id: jsonable_encoder(value) for product_id, value in (await loader(missing)).items()}
+        found.update(loaded)
+        if generation == self.generation:
+            for product_id, value in loaded.items():
+                self.items.set(f"product:{product_id}", value)
+            if self.redis is not None and loaded:
+                await self._redis_set_many({f"product:{i}": value for i, value in loaded.items()})
+        return found
+
+    async def get_page(self, key: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return a list page from the local cache, loading and caching it on a miss"""
+        value = self.pages.get(key)
+        if value is not None:
+            return value
+
+        generation = self.generation
+        value = await loader()
+        if generation == self.generation:
+            self.pages.set(key, value)
+        return value
+
+    def evict(self, product_ids: Iterable[int] = ()):
+        """Drop local entries for the given products and every cached page"""
+        self.generation += 1
+        for product_id in product_ids:
+            self.items.delete(f"product:{product_id}")
+        self.pages.clear()
+
+    async def invalidate(self, product_ids: Iterable[int] = ()):
+        """Evict locally and in Redis, then tell every other replica to evict.
+
+        If the event bus is down the change is kept and published once it
+        reconnects, so other replicas do not serve stale products until
+        their entries expire.
+        """
+        product_ids = list(product_ids)
+        self.evict(product_ids)
+
+        if self.redis is not None and product_ids:
+            try:
+                await self.redis.delete(*(REDIS_KEY_PREFIX + f"product:{i}" for i in product_ids))
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning("Failed to invalidate shared product cache: %s", e)
+
+        if self.queue is None:
+            return
+        if self._retry is None and await self.queue.publish(_changed(product_ids)):
+            return
+
+        self.deferred_invalidations += 1
+        INVALIDATIONS_DEFERRED.inc()
+        if self._unpublished is not None:
+            self._unpublished.update(product_ids)
+            if len(self._unpublished) > MAX_UNPUBLISHED_IDS:
+                self._unpublished = None
+        self._unpublished_any = True
+        if self._retry is None:
+            logger.warning("Event bus unavailable, %s will be published once it reconnects", PRODUCT_CHANGED)
+            self._retry = asyncio.create_task(self._publish_unpublished())
+
+    async def _publish_unpublished(self):
+        try:
+            while self._unpublished_any:
+                await self.queue.wait_connected()
+                product_ids, self._unpublished, self._unpublished_any = self._unpublished, set(), False
+                if await self.queue.publish(_changed(product_ids)):
+                    logger.info("Published deferred %s", PRODUCT_CHANGED)
+                    continue
+                # Put them back, merged with anything changed meanwhile
+                if product_ids is None or self._unpublished is None:
+                    self._unpublished = None
+                else:
+                    self._unpublished.update(product_ids)
+                self._unpublished_any = True
+                await asyncio.sleep(1.0)
+        finally:
+            self._retry = None
+
+    def on_product_changed(self, message: Message):
+        """Event bus callback for changes made by any replica"""
+        if message.payload.get("all"):
+            self.items.clear()
+        self.evict(message.payload.get("product_ids", []))
+
+    async def close(self):
+        if self._retry is not None:
+            self._retry.cancel()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "items": self.items.stats(),
+            "pages": self.pages.stats(),
+            "redis": {
+                "enabled": self.redis is not None,
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "errors": self.redis_errors,
+            },
+            "deferred_invalidations": self.deferred_invalidations,
+            "invalidation_pending": self._unpublished_any,
+        }
+
+    async def _redis_get(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self.redis.get(REDIS_KEY_PREFIX + key)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning("Shared product cache read failed: %s", e)
+            return None
+        if raw is None:
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        return json.loads(raw)
+
+    async def _redis_get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        try:
+            raws = await self.redis.mget([REDIS_KEY_PREFIX + key for key in keys])
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning("Shared product cache read failed: %s", e)
+            return [None] * len(keys)
+        values = []
+        for raw in raws:
+            if raw is None:
+                self.redis_misses += 1
+                values.append(None)
+            else:
+                self.redis_hits += 1
+                values.append(json.loads(raw))
+        return values
+
+    async def _redis_set_many(self, values: Dict[str, Any]):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(REDIS_KEY_PREFIX + key, json.dumps(value), ex=int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning("Shared product cache write failed: %s", e)
+
+    async def _redis_set(self, key: str, value: Any):
+        try:
+            await self.redis.set(REDIS_KEY_PREFIX + key, json.dumps(value), ex=int(self.ttl))
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning("Shared product cache write failed: %s", e)
+
+
+def _changed(product_ids: Optional[Iterable[int]]) -> Message:
+    """The product.changed event; ``None`` tells replicas to evict every product"""
+    payload = {"product_ids": list(product_ids)} if product_ids is not None else {"product_ids": [], "all": True}
+    return Message(event_type=PRODUCT_CHANGED, payload=payload, service="product_service")
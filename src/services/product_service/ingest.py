@@ -0,0 +1,256 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import asyncpg
+from pydantic import ValidationError
+
+from .models import ProductCreate
+from ..common.database import Database
+from ..common.outbox import copy_to_outbox
+
+# Records validated and copied per batch
+INGEST_CHUNK_SIZE = 5000
+
+# Rejected rows echoed back in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Scale of products.price, DECIMAL(10,2)
+CENTS = Decimal("0.01")
+
+
+class IngestTimeout(Exception):
+    """Raised when an atomic ingest loses its transaction, normally to the idle timeout"""
+
+
+class IngestReport:
+    """Running totals for one bulk ingest"""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+
+    def reject(self, line: int, detail: Any):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.accepted / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Split a streamed request body into numbered text lines.
+
+    Blank lines are kept, since they may sit inside a quoted CSV field;
+    the parsers skip them between records.
+    """
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8").rstrip("\r")
+    if buffer.strip():
+        yield number + 1, buffer.decode("utf-8").rstrip("\r")
+
+
+class _LineFeed:
+    """Lines handed to a csv.reader one complete record at a time"""
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def parse_csv(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Turn CSV records into dicts keyed by the header row.
+
+    Quoted fields may span lines, so lines are buffered until their quotes
+    balance and then read by a single csv.reader. Records are numbered by
+    their first line.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    record: List[str] = []
+    number = 0
+    async for line_number, text in lines:
+        if not record:
+            if not text.strip():
+                continue
+            number = line_number
+        record.append(text + "\n")
+        if sum(line.count('"') for line in record) % 2:
+            continue
+        feed.lines.extend(record)
+        record = []
+        values = next(reader)
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield number, dict(zip(header, values))
+    if record:
+        yield number, ValueError("Unterminated quoted field")
+
+
+async def parse_ndjson(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Turn NDJSON lines into dicts"""
+    async for number, text in lines:
+        if not text.strip():
+            continue
+        try:
+            yield number, json.loads(text)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+
+
+async def ingest_products(
+    database: Database,
+    records: AsyncIterator[Tuple[int, Any]],
+    atomic: bool = True,
+    event_type: Optional[str] = None,
+    service: Optional[str] = None,
+    idle_timeout: Optional[float] = None,
+) -> IngestReport:
+    """Validate records in chunks and COPY the valid ones into products.
+
+    With ``atomic`` every chunk is loaded in one transaction and a COPY
+    failure aborts the whole ingest. That transaction stays open while the
+    body streams in, so a client that stalls for more than ``idle_timeout``
+    seconds (``INGEST_IDLE_TIMEOUT``) has it ended by the server rather
+    than holding its locks indefinitely. Otherwise each chunk commits on
+    its own and a failing chunk is counted as rejected. With ``event_type``
+    each loaded product also gets an outbox event, COPYed in the same
+    transaction as the product.
+    """
+    idle_timeout = idle_timeout or float(os.environ.get("INGEST_IDLE_TIMEOUT", "30"))
+    report = IngestReport()
+
+    async with database.acquire() as conn:
+        transaction = conn.transaction() if atomic else None
+        if transaction is not None:
+            await transaction.start()
+            await conn.execute(f"SET LOCAL idle_in_transaction_session_timeout = {int(idle_timeout * 1000)}")
+        try:
+            batch: List[Tuple[int, Any]] = []
+            async for item in records:
+                batch.append(item)
+                if len(batch) >= INGEST_CHUNK_SIZE:
+                    await _load_chunk(conn, batch, report, atomic, event_type, service)
+                    batch = []
+            if batch:
+                await _load_chunk(conn, batch, report, atomic, event_type, service)
+        except asyncpg.InterfaceError as e:
+            if transaction is None:
+                raise
+            # The server closes the connection when the idle timeout fires,
+            # which also discards the transaction
+            raise IngestTimeout(
+                f"Atomic ingest aborted: connection closed, e.g. after the body stalled for {idle_timeout:g}s"
+            ) from e
+        except BaseException:
+            if transaction is not None:
+                await transaction.rollback()
+            raise
+        if transaction is not None:
+            await transaction.commit()
+
+    return report
+
+
+async def _load_chunk(
+    conn: asyncpg.Connection,
+    batch: List[Tuple[int, Any]],
+    report: IngestReport,
+    atomic: bool,
+    event_type: Optional[str],
+    service: Optional[str],
+):
+    rows = []
+    for number, data in batch:
+        if isinstance(data, Exception):
+            report.reject(number, str(data))
+            continue
+        if not isinstance(data, dict):
+            report.reject(number, "Expected an object")
+            continue
+        try:
+            product = ProductCreate(**data)
+        except ValidationError as e:
+            report.reject(number, e.errors(include_url=False, include_context=False, include_input=False))
+            continue
+        # Rounded as the column will, so events carry the stored price
+        rows.append((product.name, product.price.quantize(CENTS, rounding=ROUND_HALF_UP)))
+
+    if not rows:
+        return
+
+    if atomic:
+        await _copy_rows(conn, rows, event_type, service)
+        report.accepted += len(rows)
+        return
+
+    try:
+        async with conn.transaction():
+            await _copy_rows(conn, rows, event_type, service)
+        report.accepted += len(rows)
+    except asyncpg.PostgresError as e:
+        report.rejected += len(rows)
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append({"lines": [batch[0][0], batch[-1][0]], "detail": str(e)})
+
+
+async def _copy_rows(
+    conn: asyncpg.Connection,
+    rows: List[Tuple[str, Decimal]],
+    event_type: Optional[str],
+    service: Optional[str],
+):
+    if event_type is None:
+        await conn.copy_records_to_table("products", records=rows, columns=["name", "price"])
+        return
+
+    # COPY returns no ids, so take them from the sequence up front
+    ids = await conn.fetch(
+        "SELECT nextval(pg_get_serial_sequence('products', 'id')) AS id FROM generate_series(1, $1)",
+        len(rows)
+    )
+    await conn.copy_records_to_table(
+        "products",
+        records=[(row["id"], name, price) for row, (name, price) in zip(ids, rows)],
+        columns=["id", "name", "price"],
+    )
+    # Same payload as PRODUCT_CREATED_PAYLOAD in main.py
+    await copy_to_outbox(conn, event_type, service, (
+        {"product_id": row["id"], "name": name, "price": str(price)}
+        for row, (name, price) in zip(ids, rows)
+    ))
@@ -1,18 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
+import asyncpg
 from .models import Product, ProductCreate
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from .cache import PRODUCT_CHANGED, ProductCache
+from .ingest import (
+    CSV_CONTENT_TYPES, NDJSON_CONTENT_TYPES, IngestTimeout, ingest_products, iter_lines, parse_csv, parse_ndjson
+)
+from ..common.batching import BatchLoader, id_in_range, parse_ids
+from ..common.database import db
+from ..common.events import events
+from ..common.health import HealthMonitor, database_check, redis_check
+from ..common.logs import RequestIdMiddleware, configure_logging
+from ..common.metrics import instrument
+from ..common.outbox import outbox, with_outbox
+from ..common.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, fetch_json_page, set_next_page, stream_ndjson
+)
+from ..common.responses import json_bytes_response
 import logging
 
-app = FastAPI(title="Product Service")
-
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+product_cache = ProductCache()
+
+# Newest first; id is the keyset cursor
+PRODUCT_ORDER = "id DESC"
+
+# Recorded in the outbox with every insert and relayed to the event bus
+PRODUCT_CREATED = "product.created"
+PRODUCT_CREATED_PAYLOAD = "jsonb_build_object('product_id', id, 'name', name, 'price', price::text)"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    # Connects in the background; until Redis is up, invalidation stays local
+    await events.connect()
+    await events.subscribe(PRODUCT_CHANGED, product_cache.on_product_changed)
+    product_cache.queue = events
+    await outbox.start()
+    await health.start()
+    yield
+    await health.stop()
+    await outbox.stop()
+    await events.unsubscribe(PRODUCT_CHANGED, product_cache.on_product_changed)
+    await events.close()
+    await product_cache.close()
+    await db.disconnect()
+
+app = FastAPI(title="Product Service", lifespan=lifespan)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -22,69 +65,197 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database connection
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=os.environ["PGDATABASE"],
-        user=os.environ["PGUSER"],
-        password=os.environ["PGPASSWORD"],
-        host=os.environ["PGHOST"],
-        port=os.environ["PGPORT"],
-        cursor_factory=RealDictCursor
-    )
+# Request metrics and /metrics
+instrument(app, "product_service")
+
+# Request ids for log correlation
+app.add_middleware(RequestIdMiddleware)
+
+# /health, /health/live and /health/ready, answered from background probes
+health = HealthMonitor("product_service")
+health.add_check("postgres", database_check(db))
+health.add_check("redis", redis_check(events), critical=False)
+health.install(app)
 
-@app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+@app.get("/db/stats")
+async def db_stats():
+    """Connection pool statistics"""
+    return db.stats()
+
+@app.get("/batch/stats")
+async def batch_stats():
+    """Request coalescing statistics for product cache misses"""
+    return product_loader.stats()
+
+@app.get("/outbox/stats")
+async def outbox_stats():
+    """Outbox relay progress and lag"""
+    return outbox.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Product cache hit, miss and eviction counters"""
+    return product_cache.stats()
 
 @app.get("/products")
-def get_products():
+async def get_products(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    ids: Optional[List[str]] = Query(None)
+):
+    """Get products, newest first, one keyset page at a time.
+
+    Pass the ``X-Next-Cursor`` response header back as ``after`` to fetch the
+    next page. With ``stream=true`` every product after the cursor is
+    streamed as NDJSON and ``limit`` is ignored.
+
+    With ``ids=1,2,3`` the given products are returned instead, in the
+    order requested; unknown ids are left out. Cached products are served
+    from the cache and the rest are loaded with one query.
+    """
+    if ids is not None:
+        if after or stream:
+            raise HTTPException(status_code=400, detail="ids cannot be combined with after or stream")
+        return await get_products_by_id(request, ids)
+
+    where = ""
+    params = []
+    if after:
+        try:
+            (last_id,) = decode_cursor(after)
+            params = [int(last_id)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        where = "WHERE id < $1"
+
+    query = f"SELECT * FROM products {where} ORDER BY {PRODUCT_ORDER}"
+
+    if stream:
+        return StreamingResponse(
+            stream_ndjson(db, query, *params, order_by=PRODUCT_ORDER),
+            media_type="application/x-ndjson"
+        )
+
+    async def load_page():
+        async with db.acquire() as conn:
+            return await fetch_json_page(
+                conn, query, *params, limit=limit, cursor_columns=("id",), order_by=PRODUCT_ORDER
+            )
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM products ORDER BY id DESC")
-        products = cur.fetchall()
-        cur.close()
-        conn.close()
-        return list(products)
+        body, next_cursor = await product_cache.get_page((limit, after), load_page)
     except Exception as e:
-        logger.error(f"Error getting products: {str(e)}")
+        logger.error("Error getting products: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+    response = await json_bytes_response(request, body)
+    set_next_page(request, response, next_cursor, limit)
+    return response
+
+async def load_products(product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    async with db.acquire() as conn:
+        rows = await conn.fetch("SELECT * FROM products WHERE id = ANY($1::int[])", product_ids)
+    return {row["id"]: dict(row) for row in rows}
+
+# Concurrent cache misses for single products share one query
+product_loader = BatchLoader("products", load_products)
+
+async def load_product(product_id: int):
+    return await product_loader.load(product_id)
+
+async def get_products_by_id(request: Request, ids: List[str]):
+    try:
+        product_ids = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        products = await product_cache.get_products(product_ids, load_products)
+    except Exception as e:
+        logger.error("Error getting products by id: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    items = [products[product_id] for product_id in product_ids if product_id in products]
+    return await json_bytes_response(request, json.dumps(items, separators=(",", ":")).encode())
+
 @app.get("/products/{product_id}")
-def get_product(product_id: int):
+async def get_product(product_id: int):
+    # An out-of-range id cannot exist, and would fail the whole coalesced query
+    if not id_in_range(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM products WHERE id = %s", (product_id,))
-        product = cur.fetchone()
-        cur.close()
-        conn.close()
+        product = await product_cache.get_product(product_id, load_product)
 
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         return product
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error getting product {product_id}: {str(e)}")
+        logger.error("Error getting product %s: %s", product_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/products")
-def create_product(product: ProductCreate):
+async def create_product(product: ProductCreate):
+    try:
+        async with db.acquire() as conn:
+            new_product = await conn.fetchrow(
+                with_outbox(
+                    "INSERT INTO products (name, price) VALUES ($1, $2) RETURNING *",
+                    PRODUCT_CREATED, "product_service", PRODUCT_CREATED_PAYLOAD
+                ),
+                product.name, product.price
+            )
+        await product_cache.invalidate([new_product["id"]])
+        return dict(new_product)
+    except Exception as e:
+        logger.error("Error creating product: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/products/bulk")
+async def ingest_products_bulk(request: Request, atomic: bool = True):
+    """Bulk load products from a streamed CSV or NDJSON body.
+
+    CSV bodies need a header row with ``name`` and ``price`` columns. Records
+    are validated in chunks and loaded with COPY, each product with its
+    ``product.created`` outbox event; see ``ingest_products`` for the
+    meaning of ``atomic``.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    lines = iter_lines(request.stream())
+    if content_type in CSV_CONTENT_TYPES:
+        records = parse_csv(lines)
+    elif content_type in NDJSON_CONTENT_TYPES:
+        records = parse_ndjson(lines)
+    else:
+        raise HTTPException(status_code=415, detail="Expected a text/csv or application/x-ndjson body")
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO products (name, price) VALUES (%s, %s) RETURNING *",
-            (product.name, product.price)
+        report = await ingest_products(
+            db, records, atomic=atomic, event_type=PRODUCT_CREATED, service="product_service"
         )
-        new_product = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return new_product
+    except (asyncpg.PostgresError, UnicodeDecodeError) as e:
+        logger.error("Bulk product ingest failed: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestTimeout as e:
+        logger.error("Bulk product ingest failed: %s", e)
+        raise HTTPException(status_code=408, detail=str(e))
     except Exception as e:
-        logger.error(f"Error creating product: {str(e)}")
+        logger.error("Error ingesting products: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+    if report.accepted:
+        await product_cache.invalidate()
+
+    result = report.as_dict()
+    logger.info(
+        "Ingested %s products, rejected %s (%s rows/s)",
+        result['accepted'], result['rejected'], result['rows_per_second']
+    )
+    return result
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8002)
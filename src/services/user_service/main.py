@@ -1,16 +1,46 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import Body, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
-from .models import UserCreate
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import asyncpg
+from pydantic import ValidationError
+from .models import UserCreate, UserLogin
+from .passwords import PasswordHasherBusy, hasher
+from ..common.batching import BatchLoader, id_in_range, parse_ids
+from ..common.database import db
+from ..common.events import events
+from ..common.health import HealthMonitor, database_check, redis_check
+from ..common.logs import RequestIdMiddleware, configure_logging
+from ..common.metrics import instrument
+from ..common.outbox import outbox, with_outbox
+from ..common.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, fetch_json_page, fetch_json_rows, set_next_page,
+    stream_ndjson
+)
+from ..common.responses import json_bytes_response
 import logging
 
-app = FastAPI(title="User Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    await events.connect()
+    await outbox.start()
+    await hasher.start()
+    await health.start()
+    yield
+    await health.stop()
+    await hasher.close()
+    await outbox.stop()
+    await events.close()
+    await db.disconnect()
+
+app = FastAPI(title="User Service", lifespan=lifespan)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # CORS
@@ -22,122 +52,367 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database connection
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            os.environ["DATABASE_URL"],
-            cursor_factory=RealDictCursor
+# Request metrics and /metrics
+instrument(app, "user_service")
+
+# Request ids for log correlation
+app.add_middleware(RequestIdMiddleware)
+
+# /health, /health/live and /health/ready, answered from background probes
+health = HealthMonitor("user_service")
+health.add_check("postgres", database_check(db))
+health.add_check("redis", redis_check(events), critical=False)
+health.install(app)
+
+# Upper bound on rows accepted by POST /users/bulk, and rows per INSERT
+MAX_BULK_USERS = 10000
+BULK_CHUNK_SIZE = 1000
+
+# Columns returned by id lookups; never the password hash
+USER_COLUMNS = "id, name, email, username, created_at"
+
+# Newest first; (created_at, id) is the keyset cursor
+USER_ORDER = "created_at DESC, id DESC"
+
+# Recorded in the outbox with every insert and relayed to the event bus
+USER_CREATED = "user.created"
+USER_CREATED_PAYLOAD = "jsonb_build_object('user_id', id, 'username', username)"
+
+def _conflict_detail(error: asyncpg.UniqueViolationError) -> str:
+    """Map a unique violation on users to the API's error message"""
+    if "username" in (error.constraint_name or "") or "(username)" in (error.detail or ""):
+        return "Username already exists"
+    return "Email already registered"
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many password operations in progress, retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+@app.get("/db/stats")
+async def db_stats():
+    """Connection pool statistics"""
+    return db.stats()
+
+@app.get("/batch/stats")
+async def batch_stats():
+    """Request coalescing statistics for GET /users/{user_id}"""
+    return user_loader.stats()
+
+@app.get("/outbox/stats")
+async def outbox_stats():
+    """Outbox relay progress and lag"""
+    return outbox.stats()
+
+@app.get("/passwords/stats")
+async def password_stats():
+    """Password hashing pool statistics"""
+    return hasher.stats()
+
+@app.get("/users")
+async def get_users(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    ids: Optional[List[str]] = Query(None)
+):
+    """Get users, newest first, one keyset page at a time.
+
+    Pass the ``X-Next-Cursor`` response header back as ``after`` to fetch the
+    next page. With ``stream=true`` every user after the cursor is streamed
+    as NDJSON and ``limit`` is ignored.
+
+    With ``ids=1,2,3`` the given users are returned instead, in the order
+    requested, with one query; unknown ids are left out.
+    """
+    if ids is not None:
+        if after or stream:
+            raise HTTPException(status_code=400, detail="ids cannot be combined with after or stream")
+        return await get_users_by_id(request, ids)
+
+    where = ""
+    params = []
+    if after:
+        try:
+            created_at, last_id = decode_cursor(after)
+            params = [datetime.fromisoformat(created_at), int(last_id)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        where = "WHERE (created_at, id) < ($1, $2)"
+
+    query = f"""
+        SELECT id, name, email, created_at
+        FROM users
+        {where}
+        ORDER BY {USER_ORDER}
+    """
+
+    if stream:
+        return StreamingResponse(
+            stream_ndjson(db, query, *params, order_by=USER_ORDER),
+            media_type="application/x-ndjson"
         )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Database connection error")
 
-@app.get("/health")
-def health_check():
-    """Health check endpoint"""
     try:
-        conn = get_db_connection()
-        conn.close()
-        return {
-            "status": "healthy",
-            "database": "connected"
-        }
+        async with db.acquire() as conn:
+            body, next_cursor = await fetch_json_page(
+                conn, query, *params, limit=limit, cursor_columns=("created_at", "id"), order_by=USER_ORDER
+            )
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=503, detail="Service unhealthy")
+        logger.error("Error getting users: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = await json_bytes_response(request, body)
+    set_next_page(request, response, next_cursor, limit)
+    return response
+
+async def get_users_by_id(request: Request, ids: List[str]):
+    try:
+        user_ids = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/users")
-def get_users():
-    """Get all users"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, name, email, created_at 
-            FROM users 
-            ORDER BY created_at DESC
-        """)
-        users = cur.fetchall()
-        cur.close()
-        conn.close()
-        return list(users)
+        async with db.acquire() as conn:
+            body = await fetch_json_rows(
+                conn,
+                f"""
+                SELECT {USER_COLUMNS}
+                FROM users
+                WHERE id = ANY($1::int[])
+                ORDER BY array_position($1::int[], id)
+                """,
+                user_ids,
+                order_by="array_position($1::int[], id)"
+            )
     except Exception as e:
-        logger.error(f"Error getting users: {str(e)}")
+        logger.error("Error getting users by id: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    return await json_bytes_response(request, body)
 
 @app.post("/users")
 async def create_user(user: UserCreate):
     """Create a new user"""
     try:
-        logger.info(f"Creating new user with data: {user.model_dump(exclude_none=True)}")
-
-        conn = get_db_connection()
-        cur = conn.cursor()
+        # Hash before checking out a connection so the pool is not held
+        # while a worker grinds through it
+        try:
+            password_hash = await hasher.hash(user.password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
 
+        # Single round trip: the unique constraints on username and email
+        # reject duplicates atomically, even under concurrent signups
         try:
-            # First check if username exists
-            cur.execute("SELECT id FROM users WHERE username = %s", (user.username,))
-            if cur.fetchone():
-                raise HTTPException(status_code=400, detail="Username already exists")
-
-            # Then check if email exists
-            cur.execute("SELECT id FROM users WHERE email = %s", (user.email,))
-            if cur.fetchone():
-                raise HTTPException(status_code=400, detail="Email already registered")
-
-            # Insert new user
-            cur.execute(
-                """
-                INSERT INTO users (name, email, username, password)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, name, email, username, created_at
-                """,
-                (user.name, user.email, user.username, user.password)
-            )
-            new_user = dict(cur.fetchone())
-            conn.commit()
+            async with db.acquire() as conn:
+                row = await conn.fetchrow(
+                    with_outbox(
+                        """
+                        INSERT INTO users (name, email, username, password)
+                        VALUES ($1, $2, $3, $4)
+                        RETURNING id, name, email, username, created_at
+                        """,
+                        USER_CREATED, "user_service", USER_CREATED_PAYLOAD
+                    ),
+                    user.name, user.email, user.username, password_hash
+                )
+        except asyncpg.UniqueViolationError as e:
+            raise HTTPException(status_code=400, detail=_conflict_detail(e))
+        except asyncpg.PostgresError as e:
+            logger.error("Database error while creating user: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
 
-            # Convert datetime to string for JSON serialization
-            if 'created_at' in new_user:
-                new_user['created_at'] = new_user['created_at'].isoformat()
+        new_user = dict(row)
 
-            logger.info(f"Successfully created user: {new_user}")
-            return new_user
+        # Convert datetime to string for JSON serialization
+        if 'created_at' in new_user:
+            new_user['created_at'] = new_user['created_at'].isoformat()
 
-        except HTTPException as he:
-            raise he
-        except Exception as e:
-            logger.error(f"Database error while creating user: {str(e)}")
-            conn.rollback()
-            raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            cur.close()
-            conn.close()
+        logger.info("Created user %s", new_user["id"])
+        return new_user
 
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Unexpected error creating user: {str(e)}")
+        logger.error("Unexpected error creating user: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/users/bulk")
+async def create_users_bulk(users: List[Dict[str, Any]] = Body(...)):
+    """Create many users in one call.
+
+    Rows are validated individually and inserted with one multi-row
+    ``INSERT ... ON CONFLICT DO NOTHING`` per chunk inside a single
+    transaction. Rows repeating an earlier row's username or email are
+    rejected up front. The response carries a result for every input row,
+    in input order.
+    """
+    if len(users) > MAX_BULK_USERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_USERS} users can be created per request"
+        )
+
+    results: List[Dict[str, Any]] = [{} for _ in users]
+    valid: List[tuple[int, UserCreate]] = []
+    seen_usernames, seen_emails = set(), set()
+    for index, data in enumerate(users):
+        try:
+            user = UserCreate(**data)
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "detail": e.errors(include_url=False, include_context=False, include_input=False)
+            }
+            continue
+        # A repeat of an earlier row conflicts with it, as a separate create would
+        if user.username in seen_usernames:
+            results[index] = {"index": index, "status": "error", "detail": "Username already exists"}
+        elif user.email in seen_emails:
+            results[index] = {"index": index, "status": "error", "detail": "Email already registered"}
+        else:
+            seen_usernames.add(user.username)
+            seen_emails.add(user.email)
+            valid.append((index, user))
+
+    try:
+        password_hashes = await hasher.hash_many([u.password for _, u in valid])
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    except Exception as e:
+        logger.error("Error hashing passwords for bulk create: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                for start in range(0, len(valid), BULK_CHUNK_SIZE):
+                    chunk = valid[start:start + BULK_CHUNK_SIZE]
+                    rows = await conn.fetch(
+                        with_outbox(
+                            """
+                            INSERT INTO users (name, email, username, password)
+                            SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[])
+                            ON CONFLICT DO NOTHING
+                            RETURNING id, username, created_at
+                            """,
+                            USER_CREATED, "user_service", USER_CREATED_PAYLOAD
+                        ),
+                        [u.name for _, u in chunk],
+                        [u.email for _, u in chunk],
+                        [u.username for _, u in chunk],
+                        password_hashes[start:start + BULK_CHUNK_SIZE]
+                    )
+                    created = {row["username"]: row for row in rows}
+
+                    rejected = [u for _, u in chunk if u.username not in created]
+                    taken_usernames = set()
+                    if rejected:
+                        taken_usernames = {
+                            row["username"] for row in await conn.fetch(
+                                "SELECT username FROM users WHERE username = ANY($1::text[])",
+                                [u.username for u in rejected]
+                            )
+                        }
+
+                    for index, user in chunk:
+                        row = created.get(user.username)
+                        if row is not None:
+                            results[index] = {
+                                "index": index,
+                                "status": "created",
+                                "id": row["id"],
+                                "created_at": row["created_at"].isoformat()
+                            }
+                        elif user.username in taken_usernames:
+                            results[index] = {"index": index, "status": "error", "detail": "Username already exists"}
+                        else:
+                            results[index] = {"index": index, "status": "error", "detail": "Email already registered"}
+    except Exception as e:
+        logger.error("Error bulk creating users: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    created_count = sum(1 for result in results if result["status"] == "created")
+    logger.info("Bulk created %d of %d users", created_count, len(users))
+    return {
+        "created": created_count,
+        "failed": len(users) - created_count,
+        "results": results
+    }
+
+@app.post("/users/login")
+async def login(credentials: UserLogin):
+    """Check a username and password.
+
+    A stored hash made with older cost settings, or a password stored in
+    plain text, is replaced with a fresh hash on successful login.
+    """
+    try:
+        async with db.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT id, name, email, username, password, created_at FROM users WHERE username = $1",
+                credentials.username
+            )
+
+        try:
+            ok, new_hash = await hasher.verify(credentials.password, row["password"] if row else None)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+        if not ok:
+            raise HTTPException(status_code=401, detail="Invalid username or password")
+
+        if new_hash is not None:
+            # Only replace the hash that was verified, in case the password
+            # changed in the meantime. Best effort: the login stands either way
+            try:
+                async with db.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE users SET password = $1 WHERE id = $2 AND password = $3",
+                        new_hash, row["id"], row["password"]
+                    )
+                logger.info("Rehashed password for user %s", row['id'])
+            except Exception as e:
+                logger.warning("Error storing rehashed password for user %s: %s", row["id"], e)
+
+        user = dict(row)
+        del user["password"]
+        user["created_at"] = user["created_at"].isoformat()
+        return user
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error logging in %s: %s", credentials.username, e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def load_users(user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    async with db.acquire() as conn:
+        rows = await conn.fetch(f"SELECT {USER_COLUMNS} FROM users WHERE id = ANY($1::int[])", user_ids)
+    return {row["id"]: dict(row) for row in rows}
+
+# Concurrent GET /users/{id} requests share one query
+user_loader = BatchLoader("users", load_users)
+
 @app.get("/users/{user_id}")
-def get_user(user_id: int):
+async def get_user(user_id: int):
+    # An out-of-range id cannot exist, and would fail the whole coalesced query
+    if not id_in_range(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
+        user = await user_loader.load(user_id)
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error getting user {user_id}: {str(e)}")
+        logger.error("Error getting user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8001)
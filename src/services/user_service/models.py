@@ -11,6 +11,10 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
+class UserLogin(BaseModel):
+    username: str = Field(..., min_length=1, description="User's username")
+    password: str = Field(..., min_length=1, description="User's password")
+
 class User(UserBase):
     id: int = Field(..., description="User's unique identifier")
     created_at: datetime = Field(default_factory=datetime.utcnow)
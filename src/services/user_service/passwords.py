@@ -0,0 +1,323 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..common.metrics import CallbackGauge, Counter, Histogram
+
+try:
+    import argon2
+except ImportError:  # optional; hashlib.scrypt is used instead
+    argon2 = None
+
+logger = logging.getLogger(__name__)
+
+# Passwords hashed per worker call by hash_many
+BULK_HASH_CHUNK = 16
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "Time a worker spent hashing or verifying", ["operation"]
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_queue_wait_seconds", "Time a hash job waited for a free worker", ["operation"]
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Hash jobs refused because the queue was full", ["operation"]
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash jobs are already waiting for a worker"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, ln: int, r: int, p: int) -> bytes:
+    n = 1 << ln
+    # hashlib refuses to use more than 32 MiB unless told otherwise
+    maxmem = 128 * n * r * (p + 1) + (1 << 20)
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=32)
+
+
+def _parse_scrypt(encoded: str) -> Tuple[Dict[str, int], bytes, bytes]:
+    # $scrypt$ln=15,r=8,p=1$<salt>$<hash>
+    _, _, settings, salt, digest = encoded.split("$")
+    params = {key: int(value) for key, value in (item.split("=") for item in settings.split(","))}
+    return params, _b64decode(salt), _b64decode(digest)
+
+
+# Run in the worker processes; module level so they can be pickled
+
+
+def _hash_password(scheme: str, params: Dict[str, int], password: str) -> str:
+    if scheme == "argon2":
+        return argon2.PasswordHasher(**params).hash(password)
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, params["ln"], params["r"], params["p"])
+    return f"$scrypt$ln={params['ln']},r={params['r']},p={params['p']}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def _hash_passwords(scheme: str, params: Dict[str, int], passwords: List[str]) -> List[str]:
+    return [_hash_password(scheme, params, password) for password in passwords]
+
+
+def _is_hash(encoded: str) -> bool:
+    """Whether a stored password is a hash this module made, not plain text.
+
+    A plain-text password may itself start with ``$scrypt$``, so scrypt
+    hashes only count when they parse.
+    """
+    if encoded.startswith("$argon2"):
+        return True
+    if not encoded.startswith("$scrypt$"):
+        return False
+    try:
+        params, _, _ = _parse_scrypt(encoded)
+    except ValueError:
+        return False
+    return params.keys() == {"ln", "r", "p"}
+
+
+def _verify_password(encoded: str, password: str) -> bool:
+    if encoded.startswith("$argon2"):
+        if argon2 is None:
+            raise RuntimeError("Stored password uses argon2 but argon2-cffi is not installed")
+        try:
+            return argon2.PasswordHasher().verify(encoded, password)
+        except argon2.exceptions.VerificationError:
+            return False
+    params, salt, digest = _parse_scrypt(encoded)
+    return hmac.compare_digest(_scrypt(password, salt, params["ln"], params["r"], params["p"]), digest)
+
+
+def _default_params(scheme: str) -> Dict[str, int]:
+    if scheme == "argon2":
+        return {
+            "time_cost": int(os.environ.get("PASSWORD_ARGON2_TIME_COST", "3")),
+            "memory_cost": int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", "65536")),
+            "parallelism": int(os.environ.get("PASSWORD_ARGON2_PARALLELISM", "1")),
+        }
+    return {
+        "ln": int(os.environ.get("PASSWORD_SCRYPT_LOG_N", "15")),
+        "r": int(os.environ.get("PASSWORD_SCRYPT_R", "8")),
+        "p": int(os.environ.get("PASSWORD_SCRYPT_P", "1")),
+    }
+
+
+def default_workers() -> int:
+    """Split the cores between the service's workers, each of which has its own pool"""
+    return max((os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", "1")), 1)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded pool of worker processes.
+
+    A memory-hard hash costs tens of milliseconds of CPU, which would stall
+    the event loop if run inline. Jobs run in a process pool given this
+    service worker's share of the cores; at most ``workers`` run at once
+    and at most ``max_queue`` more may wait, beyond which callers get
+    ``PasswordHasherBusy`` instead of queueing indefinitely. Bulk jobs from
+    ``hash_many`` occupy at most ``bulk_workers`` workers, so single
+    signups and logins are not stuck behind an import.
+
+    argon2id is used when ``argon2-cffi`` is installed, otherwise scrypt.
+    Hashes record their scheme and cost parameters, so ``verify`` reports
+    when a stored hash was made with different settings (or is a plain-text
+    password from before hashing existed) and returns a replacement hash.
+    """
+
+    def __init__(self, scheme: Optional[str] = None, workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.scheme = scheme or os.environ.get("PASSWORD_HASH_SCHEME") or ("argon2" if argon2 else "scrypt")
+        if self.scheme not in ("argon2", "scrypt"):
+            raise ValueError(f"Unknown password hash scheme: {self.scheme}")
+        if self.scheme == "argon2" and argon2 is None:
+            raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 requires argon2-cffi")
+        self.params = _default_params(self.scheme)
+        self.workers = workers or int(os.environ.get("PASSWORD_HASH_WORKERS", str(default_workers())))
+        self.max_queue = max_queue or int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "100"))
+        self.bulk_workers = int(os.environ.get("PASSWORD_HASH_BULK_WORKERS", str(max(self.workers // 2, 1))))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._bulk_slots = asyncio.Semaphore(self.bulk_workers)
+        self._dummy_hash: Optional[str] = None
+
+        self.waiting = 0
+        self.running = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+
+    async def start(self):
+        """Start the worker processes"""
+        if self._executor is not None:
+            return
+        # Forking a process with a running event loop is unsafe; spawn
+        # clean interpreters instead
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        # Verified against when a username does not exist, so unknown users
+        # take as long to reject as wrong passwords
+        self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+        logger.info("Password hasher started (%s, %s, workers=%s)", self.scheme, self.params, self.workers)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def _admit(self, operation: str, jobs: int = 1):
+        if self._executor is None:
+            raise RuntimeError("Password hasher is not started")
+        if self.waiting + jobs > self.max_queue:
+            self.rejected += 1
+            PASSWORD_HASH_REJECTED.inc(operation)
+            raise PasswordHasherBusy(f"{self.waiting} password hash jobs already queued")
+
+    async def _run(self, operation: str, fn, *args, admitted: bool = False, bulk: bool = False) -> Any:
+        if not admitted:
+            self._admit(operation)
+
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            if bulk:
+                await self._bulk_slots.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                if bulk:
+                    self._bulk_slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        PASSWORD_HASH_WAIT.observe(started - queued, operation)
+        self.running += 1
+
+        def done(_):
+            # Hold the slot until the worker is actually free, even if the
+            # caller was cancelled while waiting for the result
+            self.running -= 1
+            self._slots.release()
+            if bulk:
+                self._bulk_slots.release()
+            PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation)
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            done(None)
+            raise
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+    async def hash(self, password: str) -> str:
+        encoded = await self._run("hash", _hash_password, self.scheme, self.params, password)
+        self.hashed += 1
+        return encoded
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch, several passwords per worker call.
+
+        Each call of ``BULK_HASH_CHUNK`` passwords counts as one queued job,
+        and at most ``bulk_workers`` of a batch's jobs are queued at a time,
+        the rest following as earlier ones finish. The batch is admitted or
+        refused as a whole by that first wave, so a batch of any size never
+        fails halfway through.
+        """
+        if not passwords:
+            return []
+        chunks = [passwords[i:i + BULK_HASH_CHUNK] for i in range(0, len(passwords), BULK_HASH_CHUNK)]
+        wave = asyncio.Semaphore(min(len(chunks), self.bulk_workers))
+        self._admit("hash", jobs=min(len(chunks), self.bulk_workers))
+
+        async def run(chunk: List[str]) -> List[str]:
+            async with wave:
+                return await self._run(
+                    "hash", _hash_passwords, self.scheme, self.params, chunk, admitted=True, bulk=True
+                )
+
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        self.hashed += len(passwords)
+        return [encoded for chunk in results for encoded in chunk]
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """Whether a stored hash was made with other settings than the current ones"""
+        if self.scheme == "argon2":
+            return not encoded.startswith("$argon2") or argon2.PasswordHasher(**self.params).check_needs_rehash(encoded)
+        if not encoded.startswith("$scrypt$") or not _is_hash(encoded):
+            return True
+        params, _, _ = _parse_scrypt(encoded)
+        return params != self.params
+
+    async def verify(self, password: str, encoded: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password against a stored hash.
+
+        Returns whether it matched and, when it did but the stored hash is
+        outdated, a new hash to store in its place. The rehash is best
+        effort: if it cannot be made (e.g. the queue is full), the match is
+        still reported and the hash is upgraded on a later login. Pass
+        ``None`` for an unknown user to spend the same time as a real check.
+        """
+        if encoded is None:
+            await self._run("verify", _verify_password, self._dummy_hash, password)
+            return False, None
+
+        if not _is_hash(encoded):
+            # Stored in plain text before passwords were hashed
+            ok = hmac.compare_digest(encoded.encode(), password.encode())
+        else:
+            ok = await self._run("verify", _verify_password, encoded, password)
+        self.verified += 1
+        if not ok or not self.needs_rehash(encoded):
+            return ok, None
+
+        try:
+            new_hash = await self.hash(password)
+        except Exception as e:
+            logger.warning("Skipped rehashing an outdated password hash: %s", e)
+            return True, None
+        self.rehashed += 1
+        return True, new_hash
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheme": self.scheme,
+            "params": self.params,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "bulk_workers": self.bulk_workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
+
+
+# Process-wide hasher used by the user service
+hasher = PasswordHasher()
+
+PASSWORD_HASH_QUEUE = CallbackGauge(
+    "password_hash_jobs",
+    "Hash jobs waiting for or running on a worker",
+    lambda: [(("waiting",), hasher.waiting), (("running",), hasher.running)],
+    labels=["state"],
+)
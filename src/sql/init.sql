@@ -21,6 +21,39 @@ CREATE INDEX IF NOT EXISTS users_username_idx ON users (username);
 CREATE INDEX IF NOT EXISTS users_email_idx ON users (email);
 CREATE INDEX IF NOT EXISTS products_name_idx ON products (name);
 
+-- Serves keyset pagination of GET /users (newest first)
+CREATE INDEX IF NOT EXISTS users_created_at_id_idx ON users (created_at DESC, id DESC);
+
+-- Transactional outbox: domain events inserted in the same statement or
+-- transaction as the change they describe, relayed to Redis afterwards
+CREATE TABLE IF NOT EXISTS outbox (
+  id BIGSERIAL PRIMARY KEY,
+  event_type TEXT NOT NULL,
+  payload JSONB NOT NULL,
+  service TEXT NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+  published_at TIMESTAMP WITH TIME ZONE,
+  claimed_until TIMESTAMP WITH TIME ZONE
+);
+
+-- Added after the table was first released
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP WITH TIME ZONE;
+
+-- Serves the relay's scan for unpublished events, oldest first
+CREATE INDEX IF NOT EXISTS outbox_unpublished_idx ON outbox (id) WHERE published_at IS NULL;
+
+-- Wake the relays (LISTEN outbox) once per inserting statement
+CREATE OR REPLACE FUNCTION outbox_notify() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('outbox', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER outbox_notify
+  AFTER INSERT ON outbox
+  FOR EACH STATEMENT EXECUTE FUNCTION outbox_notify();
+
 -- Comments for table structure
 COMMENT ON TABLE users IS 'User accounts for authentication and profile management';
 COMMENT ON COLUMN users.id IS 'Unique identifier for the user';
@@ -36,8 +69,18 @@ COMMENT ON COLUMN products.name IS 'Name of the product';
 COMMENT ON COLUMN products.price IS 'Price of the product';
 COMMENT ON COLUMN products.created_at IS 'Timestamp when the product was created';
 
+COMMENT ON TABLE outbox IS 'Domain events awaiting or recently relayed to the message queue';
+COMMENT ON COLUMN outbox.event_type IS 'Message event type, e.g. user.created';
+COMMENT ON COLUMN outbox.payload IS 'Message payload';
+COMMENT ON COLUMN outbox.service IS 'Service that recorded the event';
+COMMENT ON COLUMN outbox.created_at IS 'Timestamp of the transaction that recorded the event';
+COMMENT ON COLUMN outbox.published_at IS 'When the relay published the event; NULL while pending';
+COMMENT ON COLUMN outbox.claimed_until IS 'Until when a relay that claimed the event is publishing it';
+
 -- Grant necessary permissions
 GRANT SELECT, INSERT, UPDATE ON users TO CURRENT_USER;
 GRANT SELECT, INSERT, UPDATE ON products TO CURRENT_USER;
 GRANT USAGE, SELECT ON SEQUENCE users_id_seq TO CURRENT_USER;
 GRANT USAGE, SELECT ON SEQUENCE products_id_seq TO CURRENT_USER;
+GRANT SELECT, INSERT, UPDATE, DELETE ON outbox TO CURRENT_USER;
+GRANT USAGE, SELECT ON SEQUENCE outbox_id_seq TO CURRENT_USER;
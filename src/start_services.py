@@ -1,30 +1,223 @@
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
 import subprocess
 import sys
-import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s supervisor %(levelname)s %(message)s")
+logger = logging.getLogger("supervisor")
+
+SERVICES = [
+    ("user_service", "services.user_service.main:app", 8001),
+    ("product_service", "services.product_service.main:app", 8002),
+    ("github_service", "services.github_service.main:app", 8003),
+]
+
+HOST = os.environ.get('SERVICES_HOST', '0.0.0.0')
+# Seconds uvicorn gives in-flight requests to finish on SIGTERM
+GRACEFUL_TIMEOUT = float(os.environ.get('GRACEFUL_TIMEOUT', '30'))
+# Recycle a worker after this many requests (0 disables), plus up to
+# MAX_REQUESTS_JITTER more so a service's workers don't recycle together
+MAX_REQUESTS = int(os.environ.get('WORKER_MAX_REQUESTS', '0'))
+MAX_REQUESTS_JITTER = int(os.environ.get('WORKER_MAX_REQUESTS_JITTER', str(MAX_REQUESTS // 10)))
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', '60'))
+RESTART_BACKOFF = float(os.environ.get('RESTART_BACKOFF', '0.5'))
+MAX_RESTART_BACKOFF = float(os.environ.get('MAX_RESTART_BACKOFF', '30'))
+# A worker that stays up this long has its restart backoff reset
+STABLE_UPTIME = 30.0
+
+
+def default_workers() -> int:
+    """Share the cores between the services unless WEB_CONCURRENCY says otherwise"""
+    if 'WEB_CONCURRENCY' in os.environ:
+        return int(os.environ['WEB_CONCURRENCY'])
+    return max(1, (os.cpu_count() or 1) // len(SERVICES))
+
+
+class Worker:
+    """One uvicorn process accepting on its service's shared socket"""
+
+    def __init__(self, service: "Service", index: int):
+        self.service = service
+        self.index = index
+        self.process = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+    def start(self):
+        command = [
+            sys.executable, "-m", "uvicorn", self.service.app,
+            "--fd", str(self.service.socket.fileno()),
+            # uvicorn would otherwise fork its own workers from WEB_CONCURRENCY
+            "--workers", "1",
+            "--timeout-graceful-shutdown", str(int(GRACEFUL_TIMEOUT)),
+        ]
+        if MAX_REQUESTS:
+            limit = MAX_REQUESTS + random.randint(0, MAX_REQUESTS_JITTER)
+            command += ["--limit-max-requests", str(limit)]
+        env = {
+            **os.environ,
+            # Startup (and so accepting) waits for the worker's own /health to pass
+            "HEALTH_STARTUP_WAIT": os.environ.get("HEALTH_STARTUP_WAIT", str(READY_TIMEOUT)),
+            # The service's real worker count, for per-worker pools to size themselves by
+            "WEB_CONCURRENCY": str(len(self.service.workers)),
+            # Where the service's workers share metrics, so /metrics covers all of them
+            "METRICS_MULTIPROC_DIR": self.service.metrics_dir,
+        }
+        self.process = subprocess.Popen(command, pass_fds=(self.service.socket.fileno(),), env=env)
+        self.started_at = time.monotonic()
+        logger.info("Started %s worker %s (pid %s)", self.service.name, self.index, self.process.pid)
+
+    def check(self, now: float):
+        """Restart the worker if it exited, backing off on repeated crashes"""
+        if self.process is None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            if self.failures and now - self.started_at > STABLE_UPTIME:
+                self.failures = 0
+            return
+
+        self.process = None
+        if code == 0:
+            # Clean exit, e.g. recycled after --limit-max-requests
+            logger.info("%s worker %s exited, restarting", self.service.name, self.index)
+            self.restart_at = now
+            return
+        self.failures += 1
+        delay = min(RESTART_BACKOFF * 2 ** (self.failures - 1), MAX_RESTART_BACKOFF)
+        self.restart_at = now + delay
+        logger.error(
+            "%s worker %s exited with code %s, restarting in %.1f seconds", self.service.name, self.index, code, delay
+        )
+
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+class Service:
+    def __init__(self, name: str, app: str, port: int, workers: int, metrics_dir: str):
+        self.name = name
+        self.app = app
+        self.port = port
+        self.metrics_dir = os.path.join(metrics_dir, name)
+        # Snapshots left by a previous run would be added to this one's totals
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        os.makedirs(self.metrics_dir)
+        self.socket = self._bind()
+        self.workers = [Worker(self, index) for index in range(workers)]
+
+    def _bind(self) -> socket.socket:
+        # Bound once here and inherited by every worker, so the kernel spreads
+        # connections across them and restarts never close the port. It is
+        # not listened on here: uvicorn calls listen() when a worker finishes
+        # startup, so connections are refused until the first worker is healthy.
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((HOST, self.port))
+        sock.set_inheritable(True)
+        return sock
+
+    def healthy(self) -> bool:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{self.port}/health", timeout=2) as response:
+                return response.status == 200
+        except OSError:
+            return False
+
+
+class Supervisor:
+    def __init__(self):
+        # Removed on shutdown unless given explicitly
+        self.metrics_dir = os.environ.get('METRICS_MULTIPROC_DIR') or tempfile.mkdtemp(prefix="metrics-")
+        self.services = []
+        for name, app, port in SERVICES:
+            workers = int(os.environ.get(f"{name.upper()}_WORKERS", default_workers()))
+            self.services.append(Service(name, app, port, workers, self.metrics_dir))
+        self.stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for service in self.services:
+            for worker in service.workers:
+                worker.start()
+
+        threading.Thread(target=self._wait_ready, daemon=True).start()
+
+        while not self.stopping:
+            now = time.monotonic()
+            for service in self.services:
+                for worker in service.workers:
+                    worker.check(now)
+            time.sleep(0.5)
+
+        self.shutdown()
+
+    def _wait_ready(self):
+        """Report when each service answers /health, off the supervision loop"""
+        deadline = time.monotonic() + READY_TIMEOUT
+        pending = list(self.services)
+        while pending and not self.stopping:
+            for service in list(pending):
+                if service.healthy():
+                    pending.remove(service)
+                    logger.info("%s ready on port %s with %s workers", service.name, service.port, len(service.workers))
+            if not pending:
+                logger.info("All services ready")
+                return
+            if time.monotonic() > deadline:
+                names = ", ".join(service.name for service in pending)
+                logger.error("Not healthy within %.0f seconds: %s", READY_TIMEOUT, names)
+                return
+            time.sleep(0.5)
+
+    def _request_stop(self, signum, frame):
+        logger.info("Received signal %s, draining workers", signum)
+        self.stopping = True
+
+    def shutdown(self):
+        """SIGTERM every worker so uvicorn drains in-flight requests, then kill stragglers"""
+        for service in self.services:
+            for worker in service.workers:
+                worker.terminate()
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        for service in self.services:
+            for worker in service.workers:
+                if worker.process is None:
+                    continue
+                try:
+                    worker.process.wait(timeout=max(deadline - time.monotonic(), 0))
+                except subprocess.TimeoutExpired:
+                    logger.warning("%s worker %s did not drain in time, killing", service.name, worker.index)
+                    worker.process.kill()
+                    worker.process.wait()
+            service.socket.close()
+        if not os.environ.get('METRICS_MULTIPROC_DIR'):
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        logger.info("All workers stopped")
+
 
 def start_services():
     # Configure Redis connection
     os.environ.setdefault('REDIS_HOST', '0.0.0.0')
     os.environ.setdefault('REDIS_PORT', '6379')
 
-    # Start user service
-    user_service = subprocess.Popen([sys.executable, "-m", "uvicorn", "services.user_service.main:app", "--host", "0.0.0.0", "--port", "8001"])
-
-    # Start product service
-    product_service = subprocess.Popen([sys.executable, "-m", "uvicorn", "services.product_service.main:app", "--host", "0.0.0.0", "--port", "8002"])
-
-    # Start GitHub service
-    github_service = subprocess.Popen([sys.executable, "-m", "uvicorn", "services.github_service.main:app", "--host", "0.0.0.0", "--port", "8003"])
-
-    try:
-        user_service.wait()
-        product_service.wait()
-        github_service.wait()
-    except KeyboardInterrupt:
-        user_service.terminate()
-        product_service.terminate()
-        github_service.terminate()
-        sys.exit(0)
+    Supervisor().run()
 
 if __name__ == "__main__":
-    start_services()
\ No newline at end of file
+    start_services()
@@ -0,0 +1,45 @@
+import asyncio
+
+import asyncpg
+import pytest
+
+from services.common.batching import BatchLoader
+
+
+def _load_all(load_many, keys):
+    loader = BatchLoader("test", load_many, window=0.01)
+
+    async def run():
+        return await asyncio.gather(*(loader.load(key) for key in keys), return_exceptions=True)
+
+    return asyncio.run(run())
+
+
+def test_data_error_only_fails_the_bad_key():
+    calls = []
+
+    async def load_many(keys):
+        calls.append(keys)
+        if "bad" in keys:
+            raise asyncpg.DataError("invalid input")
+        return {key: key.upper() for key in keys}
+
+    results = _load_all(load_many, ["a", "bad", "b"])
+
+    assert results[0] == "A" and results[2] == "B"
+    assert isinstance(results[1], asyncpg.DataError)
+    assert len(calls) == 4
+
+
+@pytest.mark.parametrize("error", [ConnectionResetError("reset"), asyncio.TimeoutError()])
+def test_connection_error_fails_the_batch_in_one_query(error):
+    calls = []
+
+    async def load_many(keys):
+        calls.append(keys)
+        raise error
+
+    results = _load_all(load_many, ["a", "b", "c"])
+
+    assert all(result is error for result in results)
+    assert len(calls) == 1
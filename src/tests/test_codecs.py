@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+from services.message_queue.codecs import available_codecs, decode_message, encode_message
+from services.message_queue.models import Message
+
+# Wider than 64 bits; orjson would decode it as a float
+BIG_INT = 2 ** 64 + 1
+
+
+def _message(payload):
+    return Message(event_type="user.created", payload=payload, service="tests", timestamp=datetime(2026, 1, 2, 3, 4, 5))
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_json_frames_keep_big_ints(trusted):
+    raw = encode_message(_message({"id": BIG_INT}), available_codecs()["json"])
+
+    decoded = decode_message(raw, trusted=trusted)
+
+    assert decoded.payload == {"id": BIG_INT}
+    assert isinstance(decoded.payload["id"], int)
+
+
+@pytest.mark.parametrize("name", sorted(available_codecs()))
+def test_round_trip(name):
+    message = _message({"id": 42, "tags": ["a", "b"], "at": datetime(2026, 1, 1, 12, 30)})
+
+    decoded = decode_message(encode_message(message, available_codecs()[name]))
+
+    assert decoded.event_type == message.event_type
+    assert decoded.timestamp == message.timestamp
+    # Payload datetimes arrive as ISO strings whichever codec was used
+    assert decoded.payload == {"id": 42, "tags": ["a", "b"], "at": "2026-01-01T12:30:00"}
+
+
+def test_publish_many_reports_unencodable_messages(monkeypatch):
+    pytest.importorskip("orjson")
+    fakeredis = pytest.importorskip("fakeredis")
+    from services.message_queue import queue_service
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        queue_service.redis, "Redis",
+        lambda host, port, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+    )
+    queue = queue_service.MessageQueue(codec="orjson")
+
+    # orjson cannot encode the big int; the messages around it still go out
+    flags = queue.publish_many([_message({"id": 1}), _message({"id": BIG_INT}), _message({"id": 2})])
+
+    assert flags == [True, False, True]
+    assert queue.enqueue(_message({"id": BIG_INT})).result() is False
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+
+from benchmarks.fake_github import FakeGitHub
+from services.github_service import service as github_module
+from services.github_service.scheduler import RateLimitExceeded
+from services.github_service.service import GitHubService
+
+TOKEN = "gho_test"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setenv("GITHUB_CLIENT_ID", "client")
+    monkeypatch.setenv("GITHUB_CLIENT_SECRET", "secret")
+    monkeypatch.setenv("GITHUB_HTTP_RETRY_BACKOFF", "0.01")
+    monkeypatch.setenv("GITHUB_RATE_LIMIT_MAX_WAIT", "5")
+    return FakeGitHub(repos=5, latency_ms=0)
+
+
+def _run(fake, scenario):
+    async def run():
+        server = TestServer(fake.app())
+        await server.start_server()
+        github = GitHubService()
+        github.base_url = str(server.make_url("")).rstrip("/")
+        github.oauth_url = f"{github.base_url}/login/oauth"
+        try:
+            return await scenario(github)
+        finally:
+            await github.close()
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_calls_reuse_one_keep_alive_connection(fake):
+    async def scenario(github):
+        for _ in range(5):
+            await github.get_user(TOKEN)
+        await github.list_repositories(TOKEN)
+
+    _run(fake, scenario)
+
+    assert fake.requests == 6
+    assert len(fake.connections) == 1
+
+
+def test_get_is_retried_with_jittered_backoff(fake, monkeypatch):
+    jitter = []
+    uniform = github_module.random.uniform
+    monkeypatch.setattr(github_module.random, "uniform", lambda a, b: jitter.append((a, b)) or uniform(a, b))
+    fake.fail_next(503, count=2)
+
+    user = _run(fake, lambda github: github.get_user(TOKEN))
+
+    assert user.login == "octocat"
+    assert fake.requests == 3
+    assert jitter == [(0.5, 1.5), (0.5, 1.5)]
+
+
+def test_post_is_not_retried(fake):
+    fake.fail_next(503)
+
+    with pytest.raises(HTTPException) as raised:
+        _run(fake, lambda github: github.create_repository(TOKEN, "new-repo"))
+
+    assert raised.value.status_code == 503
+    assert fake.requests == 1
+
+
+def test_retry_after_is_waited_out(fake):
+    fake.fail_next(429, headers={"Retry-After": "1"})
+
+    started = time.perf_counter()
+    user = _run(fake, lambda github: github.get_user(TOKEN))
+
+    assert user.login == "octocat"
+    assert fake.requests == 2
+    assert time.perf_counter() - started >= 0.9
+
+
+def test_retry_after_beyond_max_wait_fails_fast(fake):
+    fake.fail_next(429, headers={"Retry-After": "3600"})
+
+    started = time.perf_counter()
+    with pytest.raises(RateLimitExceeded) as raised:
+        _run(fake, lambda github: github.get_user(TOKEN))
+
+    assert time.perf_counter() - started < 1
+    assert int(raised.value.headers["Retry-After"]) > 3000
+    assert fake.requests == 1
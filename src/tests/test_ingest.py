@@ -0,0 +1,32 @@
+import asyncio
+
+from services.product_service.ingest import iter_lines, parse_csv
+
+
+def _parse_csv(*chunks):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [record async for record in parse_csv(iter_lines(body()))]
+
+    return asyncio.run(run())
+
+
+def test_quoted_fields_span_lines_and_chunks():
+    records = _parse_csv(b'name,price\r\n"multi\n\nline', b' name",1.50\n', b"\nplain,2\n")
+
+    assert records == [
+        (2, {"name": "multi\n\nline name", "price": "1.50"}),
+        (6, {"name": "plain", "price": "2"}),
+    ]
+
+
+def test_unterminated_quote_is_rejected():
+    records = _parse_csv(b'name,price\nok,1\nbad,"2\n')
+
+    assert records[0] == (2, {"name": "ok", "price": "1"})
+    number, error = records[1]
+    assert number == 3
+    assert isinstance(error, ValueError)
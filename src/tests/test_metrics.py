@@ -0,0 +1,52 @@
+import multiprocessing
+
+from services.common.metrics import Counter, Gauge, Histogram, Registry
+
+
+def _metrics(registry):
+    return (
+        Counter("requests_total", "Requests", ["route"], registry=registry),
+        Gauge("in_flight", "In flight", registry=registry),
+        Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry),
+    )
+
+
+def _exited_worker(directory):
+    registry = Registry(directory)
+    requests, in_flight, latency = _metrics(registry)
+    requests.inc("/users", amount=3)
+    in_flight.set(7)
+    latency.observe(0.5)
+    registry.flush()
+
+
+def test_render_merges_every_worker(tmp_path):
+    process = multiprocessing.get_context("fork").Process(target=_exited_worker, args=(str(tmp_path),))
+    process.start()
+    process.join()
+
+    registry = Registry(str(tmp_path))
+    requests, in_flight, latency = _metrics(registry)
+    requests.inc("/users")
+    in_flight.set(2)
+    latency.observe(0.05)
+    lines = registry.render().splitlines()
+
+    # Counters and histograms include the exited worker, so totals never drop
+    assert 'requests_total{route="/users"} 4' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_count 2' in lines
+    # Gauges are per live worker
+    assert f'in_flight{{worker="{registry.worker}"}} 2' in lines
+    assert not any(line.startswith("in_flight{") and line.endswith(" 7") for line in lines)
+
+
+def test_render_without_directory_is_per_process():
+    registry = Registry()
+    requests, in_flight, _ = _metrics(registry)
+    requests.inc("/users")
+    in_flight.set(2)
+    lines = registry.render().splitlines()
+
+    assert 'requests_total{route="/users"} 1' in lines
+    assert "in_flight 2" in lines
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services.user_service.passwords import BULK_HASH_CHUNK, PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setenv("PASSWORD_SCRYPT_LOG_N", "4")
+    monkeypatch.setenv("PASSWORD_HASH_BULK_WORKERS", "1")
+    return PasswordHasher(scheme="scrypt", workers=2, max_queue=2)
+
+
+def _run(hasher, coro):
+    async def run():
+        await hasher.start()
+        try:
+            return await coro()
+        finally:
+            await hasher.close()
+    return asyncio.run(run())
+
+
+def test_hash_many_larger_than_the_queue(hasher):
+    passwords = [f"password-{i}" for i in range(hasher.max_queue * BULK_HASH_CHUNK * 3)]
+
+    async def run():
+        hashes = await hasher.hash_many(passwords)
+        return hashes, await hasher.verify(passwords[-1], hashes[-1])
+
+    hashes, (ok, _) = _run(hasher, run)
+
+    assert len(hashes) == len(passwords)
+    assert ok
+    assert hasher.waiting == 0
+
+
+def test_plain_text_password_that_looks_like_a_hash(hasher):
+    stored = "$scrypt$not-a-hash"
+
+    async def run():
+        return await hasher.verify(stored, stored), await hasher.verify("other", stored)
+
+    (ok, new_hash), (wrong, _) = _run(hasher, run)
+
+    assert ok and new_hash.startswith("$scrypt$ln=4,")
+    assert not wrong
+
+
+def test_rehash_is_best_effort(hasher, monkeypatch):
+    async def busy(password):
+        raise PasswordHasherBusy("queue full")
+
+    async def run():
+        stored = await hasher.hash("secret")
+        hasher.params = {**hasher.params, "ln": 5}
+        monkeypatch.setattr(hasher, "hash", busy)
+        return await hasher.verify("secret", stored)
+
+    ok, new_hash = _run(hasher, run)
+
+    assert ok and new_hash is None
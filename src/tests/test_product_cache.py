@@ -0,0 +1,55 @@
+import asyncio
+
+from services.product_service.cache import ProductCache, _changed
+
+
+class FakeBus:
+    """Stands in for AsyncMessageQueue, with a switchable connection"""
+
+    def __init__(self):
+        self.up = asyncio.Event()
+        self.published = []
+
+    @property
+    def connected(self):
+        return self.up.is_set()
+
+    async def wait_connected(self, timeout=None):
+        await self.up.wait()
+        return True
+
+    async def publish(self, message):
+        if not self.connected:
+            return False
+        self.published.append(message.payload)
+        return True
+
+
+def test_invalidation_is_published_once_the_bus_reconnects():
+    async def run():
+        cache = ProductCache(redis_url="")
+        cache.queue = bus = FakeBus()
+        await cache.invalidate([1, 2])
+        await cache.invalidate([3])
+        deferred = cache.stats()["deferred_invalidations"]
+
+        bus.up.set()
+        await asyncio.sleep(0.01)
+        await cache.invalidate([4])
+        await cache.close()
+        return deferred, bus.published, cache.stats()["invalidation_pending"]
+
+    deferred, published, pending = asyncio.run(run())
+
+    assert deferred == 2
+    assert published == [{"product_ids": [1, 2, 3]}, {"product_ids": [4]}]
+    assert not pending
+
+
+def test_replicas_drop_everything_when_told_to():
+    cache = ProductCache(redis_url="")
+    cache.items.set("product:1", {"id": 1})
+
+    cache.on_product_changed(_changed(None))
+
+    assert cache.items.get("product:1") is None
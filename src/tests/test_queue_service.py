@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from services.message_queue.models import Message
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from services.message_queue import queue_service
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        queue_service.redis, "Redis",
+        lambda host, port, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+    )
+    queue = queue_service.MessageQueue()
+    yield queue
+    queue.close()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_subscriptions_from_other_threads_while_listening(queue):
+    received = {}
+
+    def callback_for(event_type):
+        return lambda message: received.setdefault(event_type, []).append(message.payload)
+
+    queue.subscribe("event.0", callback_for("event.0"))
+    threads = [
+        threading.Thread(target=queue.subscribe, args=(f"event.{i}", callback_for(f"event.{i}")))
+        for i in range(1, 20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i in range(20):
+        queue.publish(Message(event_type=f"event.{i}", payload={"i": i}, service="test"))
+
+    assert _wait_for(lambda: len(received) == 20)
+    assert received["event.7"] == [{"i": 7}]
+
+
+def test_unsubscribe_while_listening(queue):
+    received = []
+    callback = received.append
+    queue.subscribe("event", callback)
+    queue.unsubscribe("event", callback)
+
+    queue.publish(Message(event_type="event", payload={}, service="test"))
+
+    time.sleep(0.3)
+    assert received == []
+    assert not queue.redis_client.pubsub_channels()
+
+
+def test_process_dispatch_refuses_bound_methods(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from services.message_queue import queue_service
+    from services.message_queue.dispatch import Dispatcher
+
+    monkeypatch.setattr(
+        queue_service.redis, "Redis",
+        lambda host, port, **kwargs: fakeredis.FakeRedis(**kwargs)
+    )
+    queue = queue_service.MessageQueue(dispatcher=Dispatcher("process", max_workers=1))
+    try:
+        with pytest.raises(ValueError):
+            queue.subscribe("event", [].append)
+        with pytest.raises(ValueError):
+            queue.subscribe("event", _Handler().handle)
+        queue.subscribe("event", print)
+        assert list(queue.subscribers) == ["event"]
+    finally:
+        queue.close()
+
+
+class _Handler:
+    def handle(self, message):
+        pass
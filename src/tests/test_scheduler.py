@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+
+from services.github_service.scheduler import RateLimitExceeded, RequestScheduler
+
+TOKEN = "token"
+
+
+def _budget(scheduler, remaining, reset_in, limit=5000):
+    scheduler.update(TOKEN, 200, {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(time.time() + reset_in),
+    })
+
+
+def test_exhausted_budget_fails_fast_with_retry_after():
+    scheduler = RequestScheduler(reserve=5, max_wait=1)
+    _budget(scheduler, remaining=3, reset_in=3600)
+
+    started = time.perf_counter()
+    with pytest.raises(RateLimitExceeded) as raised:
+        asyncio.run(scheduler.acquire(TOKEN))
+
+    assert time.perf_counter() - started < 0.5
+    assert raised.value.status_code == 429
+    assert 3500 < int(raised.value.headers["Retry-After"]) <= 3600
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_short_waits_are_paced():
+    scheduler = RequestScheduler(reserve=5, max_wait=5)
+    _budget(scheduler, remaining=5, reset_in=0.2)
+
+    started = time.perf_counter()
+    asyncio.run(scheduler.acquire(TOKEN))
+
+    assert 0.1 < time.perf_counter() - started < 1
+
+
+def test_queued_calls_give_up_after_max_wait():
+    scheduler = RequestScheduler(reserve=5, pace_fraction=1.0, max_wait=0.3)
+    # Paced at 0.2s per call; the third caller would wait past max_wait
+    _budget(scheduler, remaining=15, reset_in=2.0)
+
+    async def run():
+        return await asyncio.gather(*(scheduler.acquire(TOKEN) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert results[0] is None
+    assert any(isinstance(result, RateLimitExceeded) for result in results[1:])